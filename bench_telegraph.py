@@ -0,0 +1,51 @@
+"""Микробенчмарк конвертера описаний в узлы Telegraph.
+
+Сравнивает разбор через HTMLParser с однопроходным токенизатором и
+повторный вызов из кеша. Запуск: python bench_telegraph.py
+"""
+import json
+import timeit
+
+from utils import telegraph
+
+
+def make_description(paragraphs: int) -> str:
+    block = (
+        "<p><b>Состав:</b> мука, вода, соль &amp; специи.   Вес &nbsp;250&#160;г.<br>"
+        '<a href="https://example.com/item?id=1&amp;ref=bot">Подробнее</a> '
+        "<i>Хранить   при\n температуре до +6</i></p>"
+        "<ul><li>Пункт один</li><li><em>Пункт</em> два</li></ul>"
+        "<pre>  код\n    с отступами  </pre>"
+    )
+    return block * paragraphs
+
+
+def bench(name: str, func, html: str, rounds: int) -> float:
+    # Лучшее из пяти повторов - меньше шума от GC и планировщика
+    elapsed = min(timeit.repeat(lambda: func(html), number=rounds, repeat=5)) / rounds
+    print(f"{name:<14} {elapsed * 1000:8.3f} мс")
+    return elapsed
+
+
+def convert_uncached(html: str) -> str:
+    telegraph._content_cache.clear()
+    return telegraph._convert_html_to_content(html)
+
+
+def main():
+    for paragraphs in (10, 100, 1000):
+        html = make_description(paragraphs)
+        prepared = telegraph._prepare_html_input(html)
+        reference = json.dumps(telegraph._parse_with_html_parser(prepared), ensure_ascii=False)
+        assert convert_uncached(html) == reference, "результаты конвертеров различаются"
+
+        rounds = max(3, 2000 // paragraphs)
+        print(f"--- {len(html)} символов, {rounds} повторов")
+        slow = bench("HTMLParser", telegraph._parse_with_html_parser, prepared, rounds)
+        fast = bench("однопроходный", telegraph._parse_fast, prepared, rounds)
+        cached = bench("из кеша", telegraph._convert_html_to_content, html, rounds)
+        print(f"ускорение: x{slow / fast:.1f}, кеш: x{slow / cached:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""In-process кеши справочных данных.
+
+Кеши наполняются и сбрасываются функциями из ``database.orm_query``,
+поэтому обработчики читают их без запросов к БД. Изменения из админки
+применяются к кешу своего процесса сразу, а остальные процессы бота
+перечитывают баннеры и каталог по истечении TTL
+(``BANNER_CACHE_TTL``, ``CATALOG_CACHE_TTL``).
+"""
+from __future__ import annotations
+
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable
+
+from utils.env import env_float
+
+
+@dataclass(frozen=True, slots=True)
+class BannerRecord:
+    name: str
+    image: str | None
+    description: str | None
+
+
+class BannerCache:
+    """Все баннеры (информационные страницы), загруженные одним запросом."""
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        self.ttl = ttl
+        self._banners: dict[str, BannerRecord] = {}
+        self._loaded_at: float | None = None
+        self.loaded = False
+        # Меняется при каждой перезагрузке/сбросе, чтобы зависимые
+        # мемоизации (например, пути к файлам баннеров) знали об изменениях.
+        self.version = 0
+
+    def load(self, banners: Iterable) -> None:
+        self._banners = {
+            banner.name: BannerRecord(banner.name, banner.image, banner.description)
+            for banner in banners
+        }
+        self.loaded = True
+        self._loaded_at = time.monotonic()
+        self.version += 1
+
+    @property
+    def fresh(self) -> bool:
+        return self.loaded and time.monotonic() - self._loaded_at < self.ttl
+
+    def get(self, name: str) -> BannerRecord | None:
+        return self._banners.get(name)
+
+    def invalidate(self) -> None:
+        self._banners = {}
+        self.loaded = False
+        self.version += 1
+
+
+banner_cache = BannerCache(ttl=env_float("BANNER_CACHE_TTL", 300.0))
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryRecord:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class ProductRecord:
+    id: int
+    name: str
+    description: str | None
+    details_url: str | None
+    price: Decimal
+    image: str | None
+    category_id: int
+
+
+class CatalogCache:
+    """Read-only модель каталога: категории, id товаров по категориям и товары.
+
+    Строится одним запросом, затем точечно обновляется при изменениях
+    из админки и целиком перечитывается раз в ``ttl`` секунд (правки из
+    других процессов). ``version`` растёт при каждом изменении.
+    """
+
+    def __init__(self, ttl: float = 60.0) -> None:
+        self.ttl = ttl
+        self._loaded_at: float | None = None
+        self.loaded = False
+        self.version = 0
+        self._categories: dict[int, CategoryRecord] = {}
+        self._categories_list: tuple[CategoryRecord, ...] = ()
+        self._products: dict[int, ProductRecord] = {}
+        self._by_category: dict[int, list[int]] = {}
+
+    def load(
+        self, categories: Iterable[CategoryRecord], products: Iterable[ProductRecord]
+    ) -> None:
+        self._categories = {category.id: category for category in categories}
+        self._products = {product.id: product for product in products}
+        self._by_category = {category_id: [] for category_id in self._categories}
+        for product_id in sorted(self._products):
+            category_id = self._products[product_id].category_id
+            self._by_category.setdefault(category_id, []).append(product_id)
+        self.loaded = True
+        self._loaded_at = time.monotonic()
+        self._changed()
+
+    @property
+    def fresh(self) -> bool:
+        return self.loaded and time.monotonic() - self._loaded_at < self.ttl
+
+    def invalidate(self) -> None:
+        self.loaded = False
+        self._categories = {}
+        self._products = {}
+        self._by_category = {}
+        self._changed()
+
+    def _changed(self) -> None:
+        self._categories_list = tuple(
+            self._categories[category_id] for category_id in sorted(self._categories)
+        )
+        self.version += 1
+
+    # чтение
+
+    def categories(self) -> tuple[CategoryRecord, ...]:
+        return self._categories_list
+
+    def category(self, category_id: int) -> CategoryRecord | None:
+        return self._categories.get(category_id)
+
+    def product(self, product_id: int) -> ProductRecord | None:
+        return self._products.get(product_id)
+
+    def products(self, category_id: int) -> list[ProductRecord]:
+        return [self._products[product_id] for product_id in self._by_category.get(category_id, ())]
+
+    def product_count(self, category_id: int) -> int:
+        return len(self._by_category.get(category_id, ()))
+
+    def product_at(self, category_id: int, offset: int) -> ProductRecord | None:
+        product_ids = self._by_category.get(category_id, ())
+        if 0 <= offset < len(product_ids):
+            return self._products[product_ids[offset]]
+        return None
+
+    # точечные изменения
+
+    def put_category(self, category: CategoryRecord) -> None:
+        self._categories[category.id] = category
+        self._by_category.setdefault(category.id, [])
+        self._changed()
+
+    def remove_category(self, category_id: int) -> None:
+        self._categories.pop(category_id, None)
+        # товары удаляются каскадом вместе с категорией
+        for product_id in self._by_category.pop(category_id, ()):
+            self._products.pop(product_id, None)
+        self._changed()
+
+    def put_product(self, product: ProductRecord) -> None:
+        self._unlink_product(product.id)
+        self._products[product.id] = product
+        insort(self._by_category.setdefault(product.category_id, []), product.id)
+        self._changed()
+
+    def remove_product(self, product_id: int) -> None:
+        self._unlink_product(product_id)
+        self._products.pop(product_id, None)
+        self._changed()
+
+    def _unlink_product(self, product_id: int) -> None:
+        previous = self._products.get(product_id)
+        if previous is None:
+            return
+        product_ids = self._by_category.get(previous.category_id)
+        if product_ids:
+            index = bisect_left(product_ids, product_id)
+            if index < len(product_ids) and product_ids[index] == product_id:
+                del product_ids[index]
+
+
+catalog = CatalogCache(ttl=env_float("CATALOG_CACHE_TTL", 60.0))
+
+
+class KnownUsersCache:
+    """Ограниченный LRU-набор user_id, которые точно есть в таблице user."""
+
+    def __init__(self, maxsize: int = 100_000) -> None:
+        self.maxsize = maxsize
+        self._ids: OrderedDict[int, None] = OrderedDict()
+
+    def __contains__(self, user_id: int) -> bool:
+        if user_id not in self._ids:
+            return False
+        self._ids.move_to_end(user_id)
+        return True
+
+    def add(self, user_id: int) -> None:
+        self._ids[user_id] = None
+        self._ids.move_to_end(user_id)
+        while len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+
+    def discard(self, user_id: int) -> None:
+        self._ids.pop(user_id, None)
+
+
+known_users = KnownUsersCache()
+
+
+class AdminIdsCache:
+    """user_id администраторов; перечитывается из БД по истечении TTL."""
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        self.ttl = ttl
+        self._ids: set[int] = set()
+        self._loaded_at: float | None = None
+
+    @property
+    def fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def load(self, user_ids: Iterable[int]) -> None:
+        self._ids = set(user_ids)
+        self._loaded_at = time.monotonic()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._ids
+
+    def set_admin(self, user_id: int, is_admin: bool) -> None:
+        if is_admin:
+            self._ids.add(user_id)
+        else:
+            self._ids.discard(user_id)
+
+
+admin_ids = AdminIdsCache()
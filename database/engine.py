@@ -1,17 +1,163 @@
+import asyncio
+import logging
 import os
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from database.models import Base
-from database.orm_query import orm_add_banner_description
+from database.orm_query import (
+    orm_add_banner_description,
+    orm_load_admins,
+    orm_load_banners,
+    orm_load_catalog,
+    orm_load_restricted_words,
+    orm_seed_restricted_words,
+)
+from common.restricted_words import restricted_words
 from common.texts_for_db import description_for_info_pages
+from utils.env import env_bool, env_float, env_int
+
+logger = logging.getLogger(__name__)
 
 # 🔑 Строка подключения берётся из .env
 DATABASE_URL = os.getenv("DB_URL")
 if not DATABASE_URL:
     raise ValueError("❌ DB_URL is not set in .env")
 
+
+# Границы корзин гистограмм времени (секунды)
+_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = _TIME_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        cumulative: dict[str, int] = {}
+        total = 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            cumulative[f"le_{bound}"] = total
+        return {"buckets": cumulative, "sum": round(self.sum, 6), "count": self.count}
+
+
+class PoolMetrics:
+    """Счётчики и гистограммы пула соединений, наполняемые событиями пула."""
+
+    def __init__(self) -> None:
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        # ожидание свободного соединения и время его удержания
+        self.wait_time = Histogram()
+        self.hold_time = Histogram()
+
+    def snapshot(self, pool) -> dict:
+        def _call(name: str):
+            method = getattr(pool, name, None)
+            return method() if callable(method) else None
+
+        return {
+            "size": _call("size"),
+            "checked_out": _call("checkedout"),
+            "overflow": _call("overflow"),
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "wait_time": self.wait_time.snapshot(),
+            "hold_time": self.hold_time.snapshot(),
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий ожидание соединения (событий для этого в SQLAlchemy нет)."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.wait_time.observe(time.perf_counter() - started)
+
+
+def _engine_options(url: str) -> dict:
+    # SQLite (локальная разработка) использует свой пул без этих параметров
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": env_int("DB_POOL_SIZE", 5),
+        "max_overflow": env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": env_float("DB_POOL_TIMEOUT", 30.0),
+        "pool_recycle": env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": env_bool("DB_POOL_PRE_PING", True),
+    }
+
+
 # ⚡️ Создаём движок PostgreSQL
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+engine = create_async_engine(
+    DATABASE_URL, echo=False, future=True, **_engine_options(DATABASE_URL)
+)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    pool_metrics.connects += 1
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.checkouts += 1
+    connection_record.info["checked_out_at"] = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    pool_metrics.checkins += 1
+    started = connection_record.info.pop("checked_out_at", None)
+    if started is not None:
+        pool_metrics.hold_time.observe(time.perf_counter() - started)
+
+
+@event.listens_for(engine.sync_engine, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_metrics.invalidations += 1
+
+
+def get_pool_metrics() -> dict:
+    return pool_metrics.snapshot(engine.pool)
+
+
+async def log_pool_metrics(interval: float) -> None:
+    """Периодически писать метрики пула в лог (запускается фоновой задачей)."""
+    while True:
+        await asyncio.sleep(interval)
+        logger.info("DB pool metrics: %s", get_pool_metrics())
 
 # ⚡️ Session factory
 session_maker = async_sessionmaker(
@@ -29,6 +175,13 @@ async def create_db():
     async with session_maker() as session:
         # только баннеры (описания под страницами)
         await orm_add_banner_description(session, description_for_info_pages)
+        # стартовый список запрещённых слов для модерации групп
+        await orm_seed_restricted_words(session, restricted_words)
+        # прогреваем in-process кеши, чтобы меню и фильтры не ходили в БД
+        await orm_load_banners(session)
+        await orm_load_admins(session)
+        await orm_load_catalog(session)
+        await orm_load_restricted_words(session)
 
 
 async def drop_db():
@@ -0,0 +1,284 @@
+"""Хранилища FSM: SQL (таблица fsm_state), Redis и read-through кеш поверх них.
+
+Выбор бэкенда - переменная окружения ``FSM_STORAGE`` (memory | sql | redis).
+По умолчанию memory: обновления не ходят в БД. sql/redis нужны, чтобы
+сценарии переживали перезапуск или были общими для нескольких процессов.
+"""
+from __future__ import annotations
+
+import copy
+import json
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.orm_query import (
+    orm_get_fsm_record,
+    orm_purge_fsm,
+    orm_set_fsm_data,
+    orm_set_fsm_record,
+    orm_set_fsm_state,
+)
+from utils.env import env_float, env_int
+
+__all__ = ["CachedStorage", "SQLStorage", "create_fsm_storage"]
+
+
+def _dumps(data: Mapping[str, Any]) -> str:
+    # компактный JSON: без пробелов и \u-экранирования кириллицы
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+def _check_data(data: Mapping[str, Any]) -> None:
+    if not isinstance(data, dict):
+        raise DataNotDictLikeError(
+            f"Data must be a dict or dict-like object, got {type(data).__name__}"
+        )
+
+
+# Данные строки, прочитанной get_state в текущем апдейте: (ключ, данные).
+# FSMContextMiddleware читает состояние, а обработчик затем данные - той же
+# строкой, поэтому второй SELECT не нужен. ContextVar - у каждого апдейта свой.
+_prefetched: ContextVar[tuple[str, Dict[str, Any]] | None] = ContextVar(
+    "fsm_prefetched", default=None
+)
+
+
+class SQLStorage(BaseStorage):
+    """FSM в таблице ``fsm_state``: состояние и данные в одной строке.
+
+    Каждая запись живёт ``ttl`` секунд с последнего изменения, после чего
+    считается брошенной; просроченные строки периодически удаляются.
+    """
+
+    def __init__(
+        self,
+        session_pool: async_sessionmaker,
+        *,
+        ttl: float | None = 86400,
+        purge_interval: float = 3600,
+        key_builder: KeyBuilder | None = None,
+    ) -> None:
+        self.session_pool = session_pool
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._purged_at = time.monotonic()
+
+    def _expires_at(self) -> datetime | None:
+        if not self.ttl:
+            return None
+        return _utcnow() + timedelta(seconds=self.ttl)
+
+    async def get_record(self, key: StorageKey) -> tuple[Optional[str], Dict[str, Any]]:
+        """Состояние и данные одним запросом."""
+        async with self.session_pool() as session:
+            record = await orm_get_fsm_record(session, self.key_builder.build(key))
+        if record is None:
+            return None, {}
+        if record.expires_at is not None and record.expires_at < _utcnow():
+            return None, {}
+        data = json.loads(record.data) if record.data else {}
+        return record.state, data
+
+    def _take_prefetched(self, key: StorageKey) -> Dict[str, Any] | None:
+        prefetched = _prefetched.get()
+        if prefetched is None or prefetched[0] != self.key_builder.build(key):
+            return None
+        _prefetched.set(None)
+        return prefetched[1]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _prefetched.set(None)
+        async with self.session_pool() as session:
+            await orm_set_fsm_state(
+                session, self.key_builder.build(key), _state_name(state), self._expires_at()
+            )
+            await self._maybe_purge(session)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, data = await self.get_record(key)
+        _prefetched.set((self.key_builder.build(key), data))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        _check_data(data)
+        _prefetched.set(None)
+        async with self.session_pool() as session:
+            await orm_set_fsm_data(
+                session,
+                self.key_builder.build(key),
+                _dumps(data) if data else None,
+                self._expires_at(),
+            )
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = self._take_prefetched(key)
+        if data is not None:
+            return data
+        _, data = await self.get_record(key)
+        return data
+
+    async def set_record(
+        self, key: StorageKey, state: StateType, data: Mapping[str, Any]
+    ) -> None:
+        """Записать состояние и данные одним запросом."""
+        _check_data(data)
+        _prefetched.set(None)
+        async with self.session_pool() as session:
+            await orm_set_fsm_record(
+                session,
+                self.key_builder.build(key),
+                _state_name(state),
+                _dumps(data) if data else None,
+                self._expires_at(),
+            )
+            await self._maybe_purge(session)
+
+    async def _maybe_purge(self, session) -> None:
+        if time.monotonic() - self._purged_at < self.purge_interval:
+            return
+        self._purged_at = time.monotonic()
+        await orm_purge_fsm(session, _utcnow())
+
+    async def close(self) -> None:
+        pass
+
+
+class CachedStorage(BaseStorage):
+    """Read-through/write-through кеш поверх другого хранилища.
+
+    Запись кеша живёт ``ttl`` секунд. Кеш корректен, пока апдейты одного
+    чата обрабатывает один процесс; при нескольких процессах без
+    «липкой» маршрутизации его нужно отключить (``FSM_CACHE_TTL=0``).
+    """
+
+    def __init__(self, storage: BaseStorage, *, ttl: float = 30.0, maxsize: int = 10_000) -> None:
+        self.storage = storage
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # key -> (expires_at, state, data)
+        self._cache: OrderedDict[StorageKey, tuple[float, Optional[str], Dict[str, Any]]] = OrderedDict()
+
+    async def _get(self, key: StorageKey) -> tuple[Optional[str], Dict[str, Any]]:
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            return entry[1], entry[2]
+
+        get_record = getattr(self.storage, "get_record", None)
+        if get_record is not None:
+            state, data = await get_record(key)
+        else:
+            state = await self.storage.get_state(key)
+            data = await self.storage.get_data(key)
+        self._put(key, state, data)
+        return state, data
+
+    def _put(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._cache[key] = (time.monotonic() + self.ttl, state, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.storage.set_state(key, state)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._put(key, _state_name(state), entry[2])
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._get(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        _check_data(data)
+        await self.storage.set_data(key, data)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._put(key, entry[1], copy.deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._get(key)
+        return copy.deepcopy(data)
+
+    async def get_record(self, key: StorageKey) -> tuple[Optional[str], Dict[str, Any]]:
+        state, data = await self._get(key)
+        return state, copy.deepcopy(data)
+
+    async def set_record(
+        self, key: StorageKey, state: StateType, data: Mapping[str, Any]
+    ) -> None:
+        _check_data(data)
+        set_record = getattr(self.storage, "set_record", None)
+        if set_record is not None:
+            await set_record(key, state, data)
+        else:
+            await self.storage.set_state(key, state)
+            await self.storage.set_data(key, data)
+        self._put(key, _state_name(state), copy.deepcopy(data))
+
+    async def close(self) -> None:
+        self._cache.clear()
+        await self.storage.close()
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Собрать FSM-хранилище по переменным окружения.
+
+    FSM_STORAGE: memory (по умолчанию) | sql | redis
+    FSM_TTL: время жизни незавершённого сценария, сек (0 - бессрочно)
+    FSM_CACHE_TTL: время жизни in-process кеша для sql/redis, сек (0 - без кеша).
+        При одном процессе бота стоит включить: иначе FSMContextMiddleware
+        читает хранилище на каждом обновлении.
+    REDIS_URL: адрес Redis-совместимого сервера для FSM_STORAGE=redis
+    """
+    backend = (os.getenv("FSM_STORAGE") or "memory").strip().lower()
+    ttl = env_int("FSM_TTL", 86400) or None
+
+    storage: BaseStorage
+    if backend not in ("sql", "redis"):
+        return MemoryStorage()
+    if backend == "redis":
+        # пакет redis нужен только для этого бэкенда
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        storage = RedisStorage.from_url(
+            os.getenv("REDIS_URL") or "redis://localhost:6379/0",
+            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+            state_ttl=ttl,
+            data_ttl=ttl,
+            json_dumps=_dumps,
+        )
+    else:
+        from database.engine import session_maker
+
+        storage = SQLStorage(session_maker, ttl=ttl)
+
+    cache_ttl = env_float("FSM_CACHE_TTL", 0)
+    if cache_ttl > 0:
+        storage = CachedStorage(storage, ttl=cache_ttl)
+    return storage
@@ -1,7 +1,7 @@
 from decimal import Decimal
 from typing import List
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Numeric, String, Text, BigInteger, func
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Numeric, String, Text, BigInteger, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from datetime import datetime
 
@@ -28,6 +28,10 @@ class Category(Base):
 
 class Product(Base):
     __tablename__ = 'product'
+    __table_args__ = (
+        # постраничный просмотр категории: COUNT и OFFSET/LIMIT по индексу
+        Index('ix_product_category_id_id', 'category_id', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(150), nullable=False)
@@ -51,7 +55,7 @@ class User(Base):
     phone: Mapped[str]  = mapped_column(String(13), nullable=True)
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
-    orders: Mapped[List['Order']] = relationship(back_populates='user')
+    orders: Mapped[List['Order']] = relationship(back_populates='user', foreign_keys='Order.user_id')
 
     # 🔹 Все заказы, где этот пользователь был реферером
     ref_orders: Mapped[List['Order']] = relationship(
@@ -62,6 +66,10 @@ class User(Base):
 
 class Cart(Base):
     __tablename__ = 'cart'
+    __table_args__ = (
+        # одна строка корзины на товар: нужна для INSERT ... ON CONFLICT
+        Index('uq_cart_user_id_product_id', 'user_id', 'product_id', unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('user.user_id', ondelete='CASCADE'), nullable=False)
@@ -74,6 +82,9 @@ class Cart(Base):
 
 class Order(Base):
     __tablename__ = 'order'
+    __table_args__ = (
+        Index('uq_order_idempotency_key', 'idempotency_key', unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
@@ -104,8 +115,11 @@ class Order(Base):
     bonus_awarded: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     bonus_amount: Mapped[Decimal | None] = mapped_column(Numeric(10, 2), nullable=True)
 
+    # 🔹 Ключ идемпотентности: один заказ на одну сессию оформления
+    idempotency_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
     # 🔹 Связи
-    user: Mapped['User'] = relationship(back_populates='orders')
+    user: Mapped['User'] = relationship(back_populates='orders', foreign_keys=[user_id])
     items: Mapped[List['OrderItem']] = relationship(
         back_populates='order',
         cascade='all, delete-orphan'
@@ -127,3 +141,20 @@ class OrderItem(Base):
 
     order: Mapped['Order'] = relationship(back_populates='items')
     product: Mapped['Product'] = relationship(back_populates='order_items')
+
+
+class FsmState(Base):
+    __tablename__ = 'fsm_state'
+
+    # ключ aiogram StorageKey, собранный DefaultKeyBuilder
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    data: Mapped[str | None] = mapped_column(Text, nullable=True)
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+
+
+class RestrictedWord(Base):
+    __tablename__ = 'restricted_word'
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    word: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
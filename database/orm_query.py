@@ -1,11 +1,44 @@
+import asyncio
 import math
+from datetime import datetime
 from decimal import Decimal
 
-from sqlalchemy import select, update, delete
+from sqlalchemy import and_, func, or_, select, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
-from database.models import Banner, Cart, Category, Order, OrderItem, Product, User
+from database.cache import (
+    BannerRecord,
+    CatalogCache,
+    CategoryRecord,
+    ProductRecord,
+    admin_ids,
+    banner_cache,
+    catalog,
+    known_users,
+)
+from database.models import (
+    Banner,
+    Cart,
+    Category,
+    FsmState,
+    Order,
+    OrderItem,
+    Product,
+    RestrictedWord,
+    User,
+)
+from utils.moderation import normalize_text, restricted_words_matcher
+
+
+def _insert(session: AsyncSession, model):
+    # INSERT с поддержкой ON CONFLICT для PostgreSQL и SQLite
+    if session.bind.dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
 
 # Простой пагинатор
 class Paginator:
@@ -69,12 +102,14 @@ async def orm_add_banner_description(session: AsyncSession, data: dict):
             session.add(Banner(name=name, description=description))
 
     await session.commit()
+    banner_cache.invalidate()
 
 
 async def orm_change_banner_image(session: AsyncSession, name: str, image: str):
     query = update(Banner).where(Banner.name == name).values(image=image)
     await session.execute(query)
     await session.commit()
+    banner_cache.invalidate()
 
 
 async def orm_get_banner(session: AsyncSession, page: str):
@@ -83,6 +118,25 @@ async def orm_get_banner(session: AsyncSession, page: str):
     return result.scalar()
 
 
+async def orm_load_banners(session: AsyncSession) -> None:
+    # Все баннеры одним запросом в in-process кеш
+    result = await session.execute(select(Banner))
+    banner_cache.load(result.scalars().all())
+
+
+# Перезагрузку по TTL выполняет один запрос, остальные ждут его результата
+_banner_reload_lock = asyncio.Lock()
+
+
+async def orm_get_cached_banner(session: AsyncSession, page: str) -> BannerRecord | None:
+    # Перечитываем по TTL, чтобы увидеть правки из других процессов
+    if not banner_cache.fresh:
+        async with _banner_reload_lock:
+            if not banner_cache.fresh:
+                await orm_load_banners(session)
+    return banner_cache.get(page)
+
+
 async def orm_get_info_pages(session: AsyncSession):
     query = select(Banner)
     result = await session.execute(query)
@@ -91,10 +145,73 @@ async def orm_get_info_pages(session: AsyncSession):
 
 ############################ Категории ######################################
 
-async def orm_get_categories(session: AsyncSession):
-    query = select(Category)
+_PRODUCT_RECORD_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.details_url,
+    Product.price,
+    Product.image,
+    Product.category_id,
+)
+
+
+def _product_record(row) -> ProductRecord:
+    return ProductRecord(
+        id=row.id,
+        name=row.name,
+        description=row.description,
+        details_url=row.details_url,
+        price=Decimal(str(row.price)),
+        image=row.image,
+        category_id=row.category_id,
+    )
+
+
+async def orm_load_catalog(session: AsyncSession) -> None:
+    # Весь каталог одним запросом: категории с товарами (LEFT JOIN)
+    query = select(
+        Category.id.label("cat_id"),
+        Category.name.label("cat_name"),
+        *_PRODUCT_RECORD_COLUMNS,
+    ).outerjoin(Product, Product.category_id == Category.id)
     result = await session.execute(query)
-    return result.scalars().all()
+    categories: dict[int, CategoryRecord] = {}
+    products: list[ProductRecord] = []
+    for row in result:
+        categories.setdefault(row.cat_id, CategoryRecord(row.cat_id, row.cat_name))
+        if row.id is not None:
+            products.append(_product_record(row))
+    catalog.load(categories.values(), products)
+
+
+_catalog_reload_lock = asyncio.Lock()
+
+
+async def _get_catalog(session: AsyncSession) -> CatalogCache:
+    # Перечитываем по TTL, чтобы увидеть правки из других процессов
+    if not catalog.fresh:
+        async with _catalog_reload_lock:
+            if not catalog.fresh:
+                await orm_load_catalog(session)
+    return catalog
+
+
+async def _refresh_catalog_product(session: AsyncSession, product_id: int) -> None:
+    if not catalog.loaded:
+        return
+    result = await session.execute(
+        select(*_PRODUCT_RECORD_COLUMNS).where(Product.id == product_id)
+    )
+    row = result.first()
+    if row is None:
+        catalog.remove_product(product_id)
+    else:
+        catalog.put_product(_product_record(row))
+
+
+async def orm_get_categories(session: AsyncSession) -> tuple[CategoryRecord, ...]:
+    return (await _get_catalog(session)).categories()
 
 async def orm_create_categories(session: AsyncSession, categories: list):
     query = select(Category)
@@ -103,6 +220,7 @@ async def orm_create_categories(session: AsyncSession, categories: list):
         return
     session.add_all([Category(name=name) for name in categories])
     await session.commit()
+    catalog.invalidate()
 
 
 async def orm_add_category(session: AsyncSession, name: str) -> Category:
@@ -110,6 +228,8 @@ async def orm_add_category(session: AsyncSession, name: str) -> Category:
     session.add(category)
     await session.commit()
     await session.refresh(category)
+    if catalog.loaded:
+        catalog.put_category(CategoryRecord(category.id, category.name))
     return category
 
 
@@ -121,12 +241,16 @@ async def orm_update_category(session: AsyncSession, category_id: int, name: str
     )
     result = await session.execute(query)
     await session.commit()
-    return result.rowcount > 0
+    updated = result.rowcount > 0
+    if updated and catalog.loaded:
+        catalog.put_category(CategoryRecord(category_id, name))
+    return updated
 
 
 async def orm_delete_category(session: AsyncSession, category_id: int) -> bool:
     result = await session.execute(delete(Category).where(Category.id == category_id))
     await session.commit()
+    catalog.remove_category(category_id)
     return result.rowcount > 0
 
 ############ Админка: добавить/изменить/удалить товар ########################
@@ -142,12 +266,23 @@ async def orm_add_product(session: AsyncSession, data: dict):
     )
     session.add(obj)
     await session.commit()
+    await _refresh_catalog_product(session, obj.id)
+    return obj.id
 
 
-async def orm_get_products(session: AsyncSession, category_id):
-    query = select(Product).where(Product.category_id == int(category_id))
-    result = await session.execute(query)
-    return result.scalars().all()
+async def orm_get_products(session: AsyncSession, category_id) -> list[ProductRecord]:
+    return (await _get_catalog(session)).products(int(category_id))
+
+
+async def orm_count_products(session: AsyncSession, category_id: int) -> int:
+    return (await _get_catalog(session)).product_count(int(category_id))
+
+
+async def orm_get_product_page(
+    session: AsyncSession, category_id: int, offset: int
+) -> ProductRecord | None:
+    # Товар текущей страницы из каталога, порядок стабилен по id
+    return (await _get_catalog(session)).product_at(int(category_id), offset)
 
 
 async def orm_get_product(session: AsyncSession, product_id: int):
@@ -171,19 +306,37 @@ async def orm_update_product(session: AsyncSession, product_id: int, data):
     )
     await session.execute(query)
     await session.commit()
+    await _refresh_catalog_product(session, product_id)
+
+
+async def orm_set_product_details_url(session: AsyncSession, product_id: int, url: str):
+    # Страница Telegraph готова: описание в карточке - ссылка на неё
+    query = (
+        update(Product)
+        .where(Product.id == product_id)
+        .values(details_url=url, description=f'<a href="{url}">Подробнее</a>')
+    )
+    await session.execute(query)
+    await session.commit()
+    await _refresh_catalog_product(session, product_id)
 
 
 async def orm_delete_product(session: AsyncSession, product_id: int):
     query = delete(Product).where(Product.id == product_id)
     await session.execute(query)
     await session.commit()
+    catalog.remove_product(product_id)
 
 ##################### Добавляем юзера в БД #####################################
 
 async def orm_get_user(session: AsyncSession, user_id: int) -> User | None:
     query = select(User).where(User.user_id == user_id)
     result = await session.execute(query)
-    return result.scalar_one_or_none()
+    user = result.scalar_one_or_none()
+    if user is None:
+        # Строку могли удалить - кеш больше не должен считать id известным
+        known_users.discard(user_id)
+    return user
 
 
 async def orm_add_user(
@@ -194,18 +347,23 @@ async def orm_add_user(
     phone: str | None = None,
     is_admin: bool = False,
 ):
-    user = await orm_get_user(session, user_id)
-    if user is None:
-        session.add(
-            User(
-                user_id=user_id,
-                first_name=first_name,
-                last_name=last_name,
-                phone=phone,
-                is_admin=is_admin,
-            )
-        )
-        await session.commit()
+    # Уже известный пользователь - без обращения к БД. Назначение
+    # администратора кешу не доверяем: строку должны записать наверняка.
+    if not is_admin and user_id in known_users:
+        return
+
+    query = _insert(session, User).values(
+        user_id=user_id,
+        first_name=first_name,
+        last_name=last_name,
+        phone=phone,
+        is_admin=is_admin,
+    ).on_conflict_do_nothing(index_elements=[User.user_id])
+    result = await session.execute(query)
+    await session.commit()
+    known_users.add(user_id)
+    if is_admin and result.rowcount > 0:
+        admin_ids.set_admin(user_id, True)
 
 
 async def orm_update_user_admin_status(
@@ -226,24 +384,96 @@ async def orm_update_user_admin_status(
         update(User).where(User.user_id == user_id).values(**values)
     )
     await session.commit()
-    return result.rowcount > 0
+    updated = result.rowcount > 0
+    if updated:
+        admin_ids.set_admin(user_id, is_admin)
+    return updated
 
 
-######################## Работа с корзинами #######################################
+async def orm_load_admins(session: AsyncSession) -> None:
+    result = await session.execute(select(User.user_id).where(User.is_admin.is_(True)))
+    admin_ids.load(result.scalars().all())
 
-async def orm_add_to_cart(session: AsyncSession, user_id: int, product_id: int):
-    query = select(Cart).where(Cart.user_id == user_id, Cart.product_id == product_id).options(joinedload(Cart.product))
-    cart = await session.execute(query)
-    cart = cart.scalar()
-    if cart:
-        cart.quantity += 1
-        await session.commit()
-        return cart
-    else:
-        session.add(Cart(user_id=user_id, product_id=product_id, quantity=1))
+
+async def orm_is_admin(session: AsyncSession, user_id: int) -> bool:
+    # Проверка по in-memory набору; в БД идём только после истечения TTL
+    if not admin_ids.fresh:
+        await orm_load_admins(session)
+    return user_id in admin_ids
+
+
+################ Модерация групп: запрещённые слова ############################
+
+def _clean_words(words) -> list[str]:
+    cleaned = (normalize_text(word).strip() for word in words if word)
+    return sorted({word for word in cleaned if word})
+
+
+async def orm_load_restricted_words(session: AsyncSession) -> None:
+    # Пересобрать матчер по текущему списку из БД
+    result = await session.execute(select(RestrictedWord.word))
+    restricted_words_matcher.load(result.scalars().all())
+
+
+async def orm_seed_restricted_words(session: AsyncSession, words) -> None:
+    # Стартовый список - только в пустую таблицу, чтобы не вернуть удалённые слова
+    if await session.scalar(select(func.count()).select_from(RestrictedWord)):
+        return
+    values = [{"word": word} for word in _clean_words(words)]
+    if values:
+        await session.execute(
+            _insert(session, RestrictedWord).on_conflict_do_nothing(
+                index_elements=[RestrictedWord.word]
+            ),
+            values,
+        )
         await session.commit()
 
 
+async def orm_get_restricted_words(session: AsyncSession) -> list[str]:
+    result = await session.execute(select(RestrictedWord.word).order_by(RestrictedWord.word))
+    return list(result.scalars().all())
+
+
+async def orm_add_restricted_words(session: AsyncSession, words) -> int:
+    values = [{"word": word} for word in _clean_words(words)]
+    if not values:
+        return 0
+    result = await session.execute(
+        _insert(session, RestrictedWord)
+        .on_conflict_do_nothing(index_elements=[RestrictedWord.word])
+        .returning(RestrictedWord.id),
+        values,
+    )
+    added = len(result.all())
+    await session.commit()
+    await orm_load_restricted_words(session)
+    return added
+
+
+async def orm_delete_restricted_words(session: AsyncSession, words) -> int:
+    cleaned = _clean_words(words)
+    if not cleaned:
+        return 0
+    result = await session.execute(delete(RestrictedWord).where(RestrictedWord.word.in_(cleaned)))
+    await session.commit()
+    await orm_load_restricted_words(session)
+    return result.rowcount
+
+
+######################## Работа с корзинами #######################################
+
+async def orm_add_to_cart(session: AsyncSession, user_id: int, product_id: int) -> int:
+    # Один запрос: новая строка или +1 к существующей (уникальный индекс user_id, product_id)
+    query = _insert(session, Cart).values(user_id=user_id, product_id=product_id, quantity=1)
+    query = query.on_conflict_do_update(
+        index_elements=[Cart.user_id, Cart.product_id],
+        set_={"quantity": Cart.quantity + 1, "updated": func.now()},
+    ).returning(Cart.quantity)
+    quantity = await session.scalar(query)
+    await session.commit()
+    return quantity
+
 
 async def orm_get_user_carts(session: AsyncSession, user_id):
     query = select(Cart).filter(Cart.user_id == user_id).options(joinedload(Cart.product))
@@ -251,6 +481,36 @@ async def orm_get_user_carts(session: AsyncSession, user_id):
     return result.scalars().all()
 
 
+async def orm_get_cart_page(session: AsyncSession, user_id: int, page: int):
+    # Одна строка корзины для страницы + число строк и сумма всей корзины
+    # (оконные функции считаются до LIMIT/OFFSET)
+    query = (
+        select(
+            Cart.product_id,
+            Cart.quantity,
+            Product.name,
+            Product.price,
+            Product.image,
+            func.count().over().label("lines"),
+            func.sum(Cart.quantity * Product.price).over().label("total"),
+        )
+        .join(Product, Product.id == Cart.product_id)
+        .where(Cart.user_id == user_id)
+        .order_by(Cart.id)
+    )
+    page = max(page or 1, 1)
+    row = (await session.execute(query.offset(page - 1).limit(1))).first()
+    if row is None and page > 1:
+        # страницы больше нет (товар удалён) - показываем последнюю
+        first = (await session.execute(query.limit(1))).first()
+        if first is not None:
+            page = first.lines
+            row = (await session.execute(query.offset(page - 1).limit(1))).first()
+    if row is None:
+        return None
+    return row, page
+
+
 async def orm_delete_from_cart(session: AsyncSession, user_id: int, product_id: int):
     query = delete(Cart).where(Cart.user_id == user_id, Cart.product_id == product_id)
     await session.execute(query)
@@ -258,20 +518,96 @@ async def orm_delete_from_cart(session: AsyncSession, user_id: int, product_id:
 
 
 async def orm_reduce_product_in_cart(session: AsyncSession, user_id: int, product_id: int):
-    query = select(Cart).where(Cart.user_id == user_id, Cart.product_id == product_id).options(joinedload(Cart.product))
-    cart = await session.execute(query)
-    cart = cart.scalar()
-
-    if not cart:
-        return
-    if cart.quantity > 1:
-        cart.quantity -= 1
+    query = (
+        update(Cart)
+        .where(Cart.user_id == user_id, Cart.product_id == product_id, Cart.quantity > 1)
+        .values(quantity=Cart.quantity - 1)
+        .returning(Cart.quantity)
+    )
+    quantity = await session.scalar(query)
+    if quantity is not None:
         await session.commit()
         return True
-    else:
-        await orm_delete_from_cart(session, user_id, product_id)
-        await session.commit()
-        return False
+
+    # Осталась последняя единица товара (или строки нет) - удаляем
+    query = (
+        delete(Cart)
+        .where(Cart.user_id == user_id, Cart.product_id == product_id)
+        .returning(Cart.id)
+    )
+    deleted = await session.scalar(query)
+    await session.commit()
+    if deleted is None:
+        return
+    return False
+
+
+######################## FSM-хранилище #######################################
+
+async def orm_get_fsm_record(session: AsyncSession, key: str) -> FsmState | None:
+    query = select(FsmState).where(FsmState.key == key)
+    result = await session.execute(query)
+    return result.scalar()
+
+
+async def orm_set_fsm_state(
+    session: AsyncSession, key: str, state: str | None, expires_at: datetime | None
+):
+    query = _insert(session, FsmState).values(key=key, state=state, expires_at=expires_at)
+    query = query.on_conflict_do_update(
+        index_elements=[FsmState.key],
+        set_={"state": state, "expires_at": expires_at, "updated": func.now()},
+    )
+    await session.execute(query)
+    await session.commit()
+
+
+async def orm_set_fsm_data(
+    session: AsyncSession, key: str, data: str | None, expires_at: datetime | None
+):
+    query = _insert(session, FsmState).values(key=key, data=data, expires_at=expires_at)
+    query = query.on_conflict_do_update(
+        index_elements=[FsmState.key],
+        set_={"data": data, "expires_at": expires_at, "updated": func.now()},
+    )
+    await session.execute(query)
+    await session.commit()
+
+
+async def orm_set_fsm_record(
+    session: AsyncSession,
+    key: str,
+    state: str | None,
+    data: str | None,
+    expires_at: datetime | None,
+):
+    # Состояние и данные одним upsert'ом
+    query = _insert(session, FsmState).values(
+        key=key, state=state, data=data, expires_at=expires_at
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[FsmState.key],
+        set_={"state": state, "data": data, "expires_at": expires_at, "updated": func.now()},
+    )
+    await session.execute(query)
+    await session.commit()
+
+
+async def orm_purge_fsm(session: AsyncSession, now: datetime) -> int:
+    # Просроченные (брошенные) и пустые записи
+    query = delete(FsmState).where(
+        or_(
+            FsmState.expires_at < now,
+            and_(FsmState.state.is_(None), FsmState.data.is_(None)),
+        )
+    )
+    result = await session.execute(query)
+    await session.commit()
+    return result.rowcount
+
+
+class PriceChangedError(ValueError):
+    """Цены или состав каталога изменились после просмотра корзины."""
 
 
 async def create_order_with_items(
@@ -285,45 +621,86 @@ async def create_order_with_items(
     phone: str,
     cart_lines: list[dict],
     total_amount: Decimal | float | str,
-) -> Order:
+    idempotency_key: str | None = None,
+) -> tuple[Order, bool]:
+    """Создать заказ. Возвращает (заказ, создан ли он этим вызовом).
+
+    Повторный вызов с тем же ``idempotency_key`` возвращает уже
+    созданный заказ и ничего не пишет.
+    """
+    if idempotency_key is not None:
+        existing = await orm_get_order_by_idempotency_key(session, idempotency_key)
+        if existing is not None:
+            return existing, False
+
     if not cart_lines:
         raise ValueError("Cart is empty, cannot create order.")
 
     total = Decimal(str(total_amount))
-
-    async with session.begin():
-        order = Order(
-            user_id=user_id,
-            full_name=full_name,
-            postal_code=postal_code,
-            address=address,
-            lat=lat,
-            lon=lon,
-            phone=phone,
-            total_amount=total,
+    items = [
+        {
+            "product_id": int(line["product_id"]),
+            "price": Decimal(str(line["price"])),
+            "quantity": int(line["quantity"]),
+        }
+        for line in cart_lines
+    ]
+    if any(item["quantity"] <= 0 for item in items):
+        raise ValueError("Cart contains non-positive quantity.")
+
+    try:
+        # Сверяем цены с каталогом в той же транзакции
+        query = select(Product.id, Product.price).where(
+            Product.id.in_({item["product_id"] for item in items})
         )
-        session.add(order)
-        await session.flush()
-
-        order_items: list[OrderItem] = []
-        for line in cart_lines:
-            product_id = int(line["product_id"])
-            quantity = int(line["quantity"])
-            price = Decimal(str(line["price"]))
-            order_items.append(
-                OrderItem(
-                    order=order,
-                    product_id=product_id,
-                    price=price,
-                    quantity=quantity,
-                )
+        prices = dict((await session.execute(query)).all())
+        for item in items:
+            if prices.get(item["product_id"]) != item["price"]:
+                raise PriceChangedError(f"Price changed for product {item['product_id']}.")
+        if sum(item["price"] * item["quantity"] for item in items) != total:
+            raise PriceChangedError("Order total does not match cart items.")
+
+        # INSERT ... RETURNING вместо flush + refresh
+        query = (
+            _insert(session, Order)
+            .values(
+                user_id=user_id,
+                full_name=full_name,
+                postal_code=postal_code,
+                address=address,
+                lat=lat,
+                lon=lon,
+                phone=phone,
+                total_amount=total,
+                idempotency_key=idempotency_key,
             )
+            .on_conflict_do_nothing(index_elements=[Order.idempotency_key])
+            .returning(Order)
+        )
+        order = await session.scalar(query)
+        if order is None:
+            # Параллельный запрос с тем же ключом успел раньше
+            await session.rollback()
+            existing = await orm_get_order_by_idempotency_key(session, idempotency_key)
+            if existing is None:
+                raise RuntimeError("Order insert returned no row.")
+            return existing, False
+
+        # Позиции заказа - одним executemany
+        await session.execute(
+            _insert(session, OrderItem), [dict(item, order_id=order.id) for item in items]
+        )
+        await session.execute(delete(Cart).where(Cart.user_id == user_id))
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
 
-        if order_items:
-            session.add_all(order_items)
+    return order, True
 
-        await session.execute(delete(Cart).where(Cart.user_id == user_id))
 
-    await session.refresh(order)
-    return order
+async def orm_get_order_by_idempotency_key(session: AsyncSession, key: str) -> Order | None:
+    query = select(Order).where(Order.idempotency_key == key)
+    result = await session.execute(query)
+    return result.scalar()
 
@@ -3,7 +3,7 @@ from aiogram import types
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.orm_query import orm_get_user
+from database.orm_query import orm_is_admin
 
 
 class ChatTypeFilter(Filter):
@@ -16,5 +16,4 @@ class ChatTypeFilter(Filter):
 
 class IsAdmin(Filter):
     async def __call__(self, message: types.Message, session: AsyncSession) -> bool:
-        user = await orm_get_user(session, message.from_user.id)
-        return bool(user and user.is_admin)
+        return await orm_is_admin(session, message.from_user.id)
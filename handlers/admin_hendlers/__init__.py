@@ -11,6 +11,7 @@ from .catalog import register_catalog_handlers
 from .category import register_category_handlers
 from .common import send_admin_menu
 from .group_admins import group_admin_router
+from .moderation import register_moderation_handlers
 
 admin_router = Router()
 admin_router.message.filter(ChatTypeFilter(["private"]), IsAdmin())
@@ -41,5 +42,6 @@ register_add_product_handlers(admin_router)
 register_catalog_handlers(admin_router)
 register_category_handlers(admin_router)
 register_banner_handlers(admin_router)
+register_moderation_handlers(admin_router)
 
 __all__ = ("admin_router", "group_admin_router")
@@ -1,18 +1,27 @@
-from aiogram import F, Router, types
+from functools import partial
+
+from aiogram import Bot, F, Router, types
 from aiogram.filters import Command, StateFilter, or_f
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from database.engine import session_maker
 from database.orm_query import (
     orm_add_product,
     orm_get_categories,
     orm_get_product,
+    orm_set_product_details_url,
     orm_update_product,
 )
 from kbds.inline import get_callback_btns
-from utils.telegraph import TelegraphError, create_telegraph_page
+from utils.telegraph import (
+    is_telegraph_configured,
+    telegraph_page_path,
+    telegraph_preview_text,
+)
+from utils.telegraph_jobs import telegraph_jobs
 
 from .common import edit_or_send_message, get_admin_main_keyboard
 
@@ -119,6 +128,7 @@ async def add_description(
         await state.update_data(
             description=AddProduct.product_for_change.description,
             details_url=getattr(AddProduct.product_for_change, "details_url", None),
+            telegraph_job=None,
         )
     else:
         content = message.html_text or message.text or ""
@@ -133,16 +143,35 @@ async def add_description(
             if AddProduct.product_for_change
             else "Описание товара"
         )
-        try:
-            details_url = await create_telegraph_page(title, content)
-        except TelegraphError as exc:
+        if not is_telegraph_configured():
             await message.answer(
-                f"Не удалось создать страницу в Telegraph: {exc}"
+                "Не удалось создать страницу в Telegraph: "
+                "переменная окружения TELEGRAPH_TOKEN не установлена."
             )
             return
 
-        link = f'<a href="{details_url}">Подробнее</a>'
-        await state.update_data(description=link, details_url=details_url)
+        # Страница публикуется в фоне; существующая - обновляется (editPage)
+        details_url = (
+            getattr(AddProduct.product_for_change, "details_url", None)
+            if AddProduct.product_for_change
+            else None
+        )
+        job_key = telegraph_jobs.submit(title, content, telegraph_page_path(details_url))
+        ready_url = telegraph_jobs.url_for(job_key)
+        if ready_url:
+            # Такое же содержимое уже опубликовано - берём готовую ссылку
+            await state.update_data(
+                description=f'<a href="{ready_url}">Подробнее</a>',
+                details_url=ready_url,
+                telegraph_job=None,
+            )
+        else:
+            # Пока страница не готова - краткий текст, который влезет в подпись к фото
+            await state.update_data(
+                description=telegraph_preview_text(content),
+                details_url=details_url,
+                telegraph_job=job_key,
+            )
 
     categories = await orm_get_categories(session)
     btns = {category.name: str(category.id) for category in categories}
@@ -203,9 +232,19 @@ async def add_image(message: types.Message, state: FSMContext, session: AsyncSes
     data = await state.get_data()
     try:
         if AddProduct.product_for_change:
-            await orm_update_product(session, AddProduct.product_for_change.id, data)
+            product_id = AddProduct.product_for_change.id
+            await orm_update_product(session, product_id, data)
         else:
-            await orm_add_product(session, data)
+            product_id = await orm_add_product(session, data)
+        if data.get("telegraph_job"):
+            on_failure = partial(
+                notify_publish_failed, message.bot, message.chat.id, data.get("name")
+            )
+            bound = telegraph_jobs.on_ready(
+                data["telegraph_job"], partial(save_details_url, product_id), on_failure
+            )
+            if not bound:
+                await on_failure("задача публикации потеряна (бот перезапускался)")
         await message.answer("Товар добавлен/изменен", reply_markup=get_admin_main_keyboard())
         await state.clear()
 
@@ -219,6 +258,23 @@ async def add_image(message: types.Message, state: FSMContext, session: AsyncSes
     AddProduct.product_for_change = None
 
 
+async def save_details_url(product_id: int, url: str) -> None:
+    async with session_maker() as session:
+        await orm_set_product_details_url(session, product_id, url)
+
+
+async def notify_publish_failed(
+    bot: Bot, chat_id: int, product_name: str | None, error: str
+) -> None:
+    await bot.send_message(
+        chat_id,
+        f"Не удалось опубликовать описание товара «{product_name or 'без названия'}» "
+        f"в Telegraph: {error}\n"
+        "В карточке осталось краткое описание. Чтобы повторить, измените описание товара.",
+        parse_mode=None,
+    )
+
+
 async def add_image_invalid(message: types.Message, state: FSMContext):
     await message.answer("Отправьте фото пищи")
 
@@ -0,0 +1,68 @@
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.orm_query import (
+    orm_add_restricted_words,
+    orm_delete_restricted_words,
+    orm_get_restricted_words,
+    orm_load_restricted_words,
+)
+from utils.moderation import restricted_words_matcher
+
+
+def register_moderation_handlers(router: Router) -> None:
+    router.message.register(show_restricted_words, Command("words"))
+    router.message.register(add_restricted_words, Command("add_words"))
+    router.message.register(delete_restricted_words, Command("del_words"))
+    router.message.register(reload_restricted_words, Command("reload_words"))
+
+
+def _split_words(command: CommandObject) -> list[str]:
+    # Слова через пробел или запятую: /add_words кабан, хомяк
+    return (command.args or "").replace(",", " ").split()
+
+
+async def show_restricted_words(message: types.Message, session: AsyncSession):
+    words = await orm_get_restricted_words(session)
+    if not words:
+        await message.answer("Список запрещённых слов пуст.\nДобавить: /add_words слово ...")
+        return
+    await message.answer(
+        f"Запрещённые слова ({len(words)}):\n{', '.join(words)}\n\n"
+        "Добавить: /add_words слово ...\nУдалить: /del_words слово ..."
+    )
+
+
+async def add_restricted_words(
+    message: types.Message, command: CommandObject, session: AsyncSession
+):
+    words = _split_words(command)
+    if not words:
+        await message.answer("Укажите слова: /add_words слово1 слово2")
+        return
+    added = await orm_add_restricted_words(session, words)
+    await message.answer(
+        f"Добавлено слов: {added}. Всего в фильтре: {len(restricted_words_matcher.words)}."
+    )
+
+
+async def delete_restricted_words(
+    message: types.Message, command: CommandObject, session: AsyncSession
+):
+    words = _split_words(command)
+    if not words:
+        await message.answer("Укажите слова: /del_words слово1 слово2")
+        return
+    deleted = await orm_delete_restricted_words(session, words)
+    await message.answer(
+        f"Удалено слов: {deleted}. Всего в фильтре: {len(restricted_words_matcher.words)}."
+    )
+
+
+async def reload_restricted_words(message: types.Message, session: AsyncSession):
+    # Если список правили прямо в БД
+    await orm_load_restricted_words(session)
+    await message.answer(
+        f"Фильтр перезагружен, слов: {len(restricted_words_matcher.words)}."
+    )
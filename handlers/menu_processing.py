@@ -1,12 +1,16 @@
+import json
+import logging
 from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
+from database.cache import banner_cache
 from database.orm_query import (
     orm_add_to_cart,
     orm_delete_from_cart,
-    orm_get_banner,
+    orm_count_products,
+    orm_get_cart_page,
+    orm_get_cached_banner,
     orm_get_categories,
-    orm_get_products,
-    orm_get_user_carts,
+    orm_get_product_page,
     orm_reduce_product_in_cart,
 )
 from kbds.inline import (
@@ -17,8 +21,8 @@ from kbds.inline import (
     get_user_catalog_btns,
     get_user_main_btns,
 )
-from utils.paginator import Paginator
-from aiogram.types import InputMediaPhoto, FSInputFile
+from utils.paginator import CountPaginator
+from aiogram.types import InputMediaPhoto, FSInputFile, Message
 from utils.money import format_money
 from utils.order import CURRENCY_SYMBOL
 
@@ -36,6 +40,83 @@ BANNER_FILE_MAP = {
 
 IMAGE_NOT_FOUND_TEXT = "Изображение не найдено или путь некорректен"
 
+# file_id загруженных в Telegram локальных баннеров:
+# путь -> [mtime_ns, size, file_id]. Изменённый файл загружается заново.
+BANNER_FILE_IDS_PATH = BANNERS_DIR / "file_ids.json"
+
+logger = logging.getLogger(__name__)
+
+
+def _load_banner_file_ids() -> dict[str, list]:
+    try:
+        data = json.loads(BANNER_FILE_IDS_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+_banner_file_ids = _load_banner_file_ids()
+
+# Мемоизация поиска файлов баннеров: имя -> путь/file_id и путь -> сигнатура.
+# Сбрасывается вместе с banner_cache (смена версии), чтобы навигация по меню
+# не делала лишних системных вызовов.
+_banner_sources: dict[str, Path | str] = {}
+_file_signatures: dict[Path, tuple[int, int] | None] = {}
+_banner_sources_version = banner_cache.version
+
+
+def _sync_banner_memo() -> None:
+    global _banner_sources_version
+    if _banner_sources_version != banner_cache.version:
+        _banner_sources.clear()
+        _file_signatures.clear()
+        _banner_sources_version = banner_cache.version
+
+
+def _file_signature(path: Path) -> tuple[int, int] | None:
+    _sync_banner_memo()
+    if path in _file_signatures:
+        return _file_signatures[path]
+    try:
+        stat = path.stat()
+    except OSError:
+        signature = None
+    else:
+        signature = (stat.st_mtime_ns, stat.st_size)
+    _file_signatures[path] = signature
+    return signature
+
+
+def local_banner_media(path: Path) -> str | FSInputFile:
+    """Вернуть сохранённый file_id баннера или файл для первой загрузки."""
+    signature = _file_signature(path)
+    cached = _banner_file_ids.get(str(path))
+    if signature and cached and tuple(cached[:2]) == signature:
+        return cached[2]
+    return FSInputFile(str(path))
+
+
+def remember_banner_file_id(media, sent: Message | bool | None) -> None:
+    """Запомнить file_id, который Telegram присвоил загруженному баннеру."""
+    source = getattr(media, "media", media)
+    if not isinstance(source, FSInputFile):
+        return
+    if not isinstance(sent, Message) or not sent.photo:
+        return
+
+    path = Path(str(source.path))
+    signature = _file_signature(path)
+    if signature is None:
+        return
+
+    _banner_file_ids[str(path)] = [*signature, sent.photo[-1].file_id]
+    try:
+        BANNER_FILE_IDS_PATH.write_text(
+            json.dumps(_banner_file_ids, ensure_ascii=False), encoding="utf-8"
+        )
+    except OSError:
+        logger.warning("Could not persist banner file_ids to %s", BANNER_FILE_IDS_PATH)
+
 
 def resolve_banner_path(name: str) -> Path | None:
     normalized = name.lower()
@@ -53,23 +134,37 @@ def resolve_banner_path(name: str) -> Path | None:
     return None
 
 
-def get_banner_media_source(banner, name: str):
+def _resolve_banner_source(banner, name: str) -> Path | str:
     local_path = resolve_banner_path(name)
     if local_path:
-        return FSInputFile(str(local_path))
+        return local_path
 
     if banner and getattr(banner, "image", None):
         stored_path = Path(str(banner.image))
         if stored_path.exists():
-            return FSInputFile(str(stored_path))
+            return stored_path
         return banner.image
 
     raise FileNotFoundError(f"No banner image available for '{name}'.")
 
 
+def get_banner_media_source(banner, name: str):
+    _sync_banner_memo()
+    source = _banner_sources.get(name)
+    if source is None:
+        source = _resolve_banner_source(banner, name)
+        # запоминаем только известные страницы, имя приходит из callback_data
+        if banner is not None or name.lower() in BANNER_FILE_MAP:
+            _banner_sources[name] = source
+
+    if isinstance(source, Path):
+        return local_banner_media(source)
+    return source
+
+
 async def build_banner_image(session: AsyncSession, menu_name: str) -> InputMediaPhoto:
     """Единый конструктор баннеров с описанием и fallback на default."""
-    banner = await orm_get_banner(session, menu_name)
+    banner = await orm_get_cached_banner(session, menu_name)
     caption = banner.description if banner and banner.description else ""
 
     try:
@@ -77,7 +172,7 @@ async def build_banner_image(session: AsyncSession, menu_name: str) -> InputMedi
     except FileNotFoundError:
         if not DEFAULT_BANNER_FILE.exists():
             raise
-        media_source = FSInputFile(str(DEFAULT_BANNER_FILE))
+        media_source = local_banner_media(DEFAULT_BANNER_FILE)
         if not caption:
             caption = IMAGE_NOT_FOUND_TEXT
 
@@ -97,7 +192,7 @@ async def catalog(session, level, menu_name):
     return image, kbds
 
 
-def pages(paginator: Paginator):
+def pages(paginator: CountPaginator):
     btns = {}
     if paginator.has_previous():
         btns["◀ Пред."] = "previous"
@@ -107,18 +202,20 @@ def pages(paginator: Paginator):
 
 
 async def products(session, level, category, page):
-    products = await orm_get_products(session, category_id=category)
+    total = await orm_count_products(session, category)
     current_page = page or 1
-    paginator = Paginator(products, page=current_page)
+    paginator = CountPaginator(total, page=current_page)
 
     if paginator.page < 1:
         paginator.page = 1
     if paginator.pages and paginator.page > paginator.pages:
         paginator.page = paginator.pages
 
-    page_items = paginator.get_page()
+    product = None
+    if total:
+        product = await orm_get_product_page(session, category, paginator.offset)
 
-    if not page_items:
+    if product is None:
         image = await build_banner_image(session, "catalog")
         image.caption = "товары отсутствуют"
         kbds = get_callback_btns(
@@ -129,8 +226,6 @@ async def products(session, level, category, page):
         )
         return image, kbds
 
-    product = page_items[0]
-
     details_line = (
         f'<a href="{product.details_url}">Подробнее</a>'
         if getattr(product, "details_url", None)
@@ -174,25 +269,23 @@ async def carts(session, level, menu_name, page, user_id, product_id):
     elif menu_name == "increment":
         await orm_add_to_cart(session, user_id, product_id)
 
-    carts = await orm_get_user_carts(session, user_id)
+    cart_page = await orm_get_cart_page(session, user_id, page)
 
-    if not carts:
+    if cart_page is None:
         image = await build_banner_image(session, "cart")
         kbds = get_user_cart(level=level, page=None, pagination_btns=None, product_id=None)
     else:
-        paginator = Paginator(carts, page=page)
-        cart = paginator.get_page()[0]
+        cart, page = cart_page
+        paginator = CountPaginator(cart.lines, page=page)
 
-        cart_price = format_money(cart.quantity * cart.product.price)
-        total_price = format_money(
-            sum(c.quantity * c.product.price for c in carts)
-        )
-        product_price = format_money(cart.product.price)
+        cart_price = format_money(cart.quantity * cart.price)
+        total_price = format_money(cart.total)
+        product_price = format_money(cart.price)
 
         image = InputMediaPhoto(
-            media=cart.product.image,
+            media=cart.image,
             caption=(
-                f"<strong>{cart.product.name}</strong>\n"
+                f"<strong>{cart.name}</strong>\n"
                 f"{product_price} {CURRENCY_SYMBOL} x {cart.quantity} = {cart_price} {CURRENCY_SYMBOL}\n"
                 f"Товар {paginator.page} из {paginator.pages} в корзине.\n"
                 f"Общая стоимость товаров в корзине {total_price} {CURRENCY_SYMBOL}"
@@ -202,9 +295,9 @@ async def carts(session, level, menu_name, page, user_id, product_id):
         pagination_btns = pages(paginator)
         kbds = get_user_cart(
             level=level,
-            page=page,
+            page=paginator.page,
             pagination_btns=pagination_btns,
-            product_id=cart.product.id,
+            product_id=cart.product_id,
         )
 
     return image, kbds
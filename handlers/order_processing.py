@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 import os
+import uuid
 from contextlib import suppress
 
 from aiogram import Bot, F, Router, types
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import (
@@ -17,11 +18,13 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.orm_query import create_order_with_items, orm_get_user_carts
+from database.orm_query import PriceChangedError, create_order_with_items, orm_get_user_carts
 from filters.chat_types import ChatTypeFilter
-from handlers.menu_processing import get_menu_content
+from handlers.menu_processing import get_menu_content, remember_banner_file_id
 from kbds.inline import MenuCallBack
-from utils import get_address_from_coords, prettify_address
+from middlewares.fsm import FSMSnapshotMiddleware
+from middlewares.outbound import background_sends
+from utils import prettify_address, reverse_geocode
 from utils.order import (
     CURRENCY_SYMBOL,
     CartData,
@@ -36,6 +39,9 @@ from utils.order import (
 order_router = Router()
 order_router.message.filter(ChatTypeFilter(["private"]))
 order_router.callback_query.filter(F.message.chat.type == "private")
+# Шаги оформления читают FSM один раз и пишут один раз за апдейт
+order_router.message.middleware(FSMSnapshotMiddleware())
+order_router.callback_query.middleware(FSMSnapshotMiddleware())
 
 
 class OrderState(StatesGroup):
@@ -304,10 +310,11 @@ async def show_postal_code_step(bot: Bot, state: FSMContext) -> None:
     )
 
 
-def order_summary_text(data: dict) -> str:
-    cart_lines: list[str] = data.get("cart_lines", [])
-    cart_block = build_cart_block(cart_lines)
-    total = data.get("cart_total", "0")
+def order_summary_text(data: dict, cart: CartData | None = None) -> str:
+    if cart is None:
+        cart = CartData.from_state(data)
+    cart_block = build_cart_block(cart.lines_for_display() if cart else [])
+    total = cart.total_text if cart else "0"
     full_name = data.get("full_name") or "—"
     postal_code = data.get("postal_code") or "—"
     address = data.get("address") or "—"
@@ -324,8 +331,8 @@ def order_summary_text(data: dict) -> str:
     )
 
 
-def completion_text(data: dict) -> str:
-    summary = order_summary_text(data)
+def completion_text(data: dict, cart: CartData | None = None) -> str:
+    summary = order_summary_text(data, cart)
     return (
         "🎉 <strong>Заказ оформлен!</strong>\n\n"
         f"{summary}\n\n"
@@ -362,10 +369,7 @@ async def start_order(
         return
 
     cart_data = CartData.from_carts(carts)
-    cart_lines = cart_data.lines_for_display()
-    total_text = cart_data.total_text
-    caption = build_review_text(cart_lines, total_text)
-    cart_items = cart_data.items_payload
+    caption = build_review_text(cart_data.lines_for_display(), cart_data.total_text)
 
     await edit_order_message(
         callback.message.bot,
@@ -379,9 +383,9 @@ async def start_order(
     await state.update_data(
         order_chat_id=callback.message.chat.id,
         order_message_id=callback.message.message_id,
-        cart_lines=cart_lines,
-        cart_items=cart_items,
-        cart_total=total_text,
+        # id сессии оформления - из него строится ключ идемпотентности заказа
+        checkout_id=uuid.uuid4().hex,
+        cart=cart_data.to_state(),
     )
 
     await callback.answer()
@@ -415,10 +419,11 @@ async def back_to_review(callback: types.CallbackQuery, state: FSMContext):
         return
 
     chat_id, message_id = await get_message_context(state)
-    data = await state.get_data()
-    cart_lines = data.get("cart_lines", [])
-    total_text = data.get("cart_total", "0")
-    caption = build_review_text(cart_lines, total_text)
+    cart_data = CartData.from_state(await state.get_data())
+    if cart_data is None:
+        caption = build_review_text([], "0")
+    else:
+        caption = build_review_text(cart_data.lines_for_display(), cart_data.total_text)
 
     await edit_order_message(
         callback.message.bot,
@@ -484,7 +489,8 @@ async def return_to_cart(
         await edit_cart_as_text()
     else:
         try:
-            await callback.message.edit_media(media=media, reply_markup=reply_markup)
+            sent = await callback.message.edit_media(media=media, reply_markup=reply_markup)
+            remember_banner_file_id(media, sent)
         except TelegramBadRequest as error:
             lower_error = str(error).lower()
             if "message is not modified" in lower_error:
@@ -717,16 +723,7 @@ async def process_location(message: types.Message, state: FSMContext):
     lat = float(location.latitude)
     lon = float(location.longitude)
 
-    try:
-        raw_address = await get_address_from_coords(lat, lon)
-    except Exception:
-        raw_address = None
-
-    if raw_address:
-        address = prettify_address(raw_address)
-    else:
-        address = prettify_address(f"{lat:.6f}, {lon:.6f}")
-
+    address = await reverse_geocode(lat, lon)
     await state.update_data(address=address, lat=lat, lon=lon)
     await show_address_confirmation(message.bot, state, address)
     await remove_user_message(message)
@@ -900,8 +897,9 @@ async def submit_order(
 
     chat_id, message_id = await get_message_context(state)
 
+    checkout_id = data.get("checkout_id")
     try:
-        order = await create_order_with_items(
+        order, created = await create_order_with_items(
             session,
             user_id=callback.from_user.id,
             full_name=customer.full_name,
@@ -912,13 +910,20 @@ async def submit_order(
             phone=customer.phone_value,
             cart_lines=cart_data.items_payload,
             total_amount=cart_data.total,
+            idempotency_key=f"{callback.from_user.id}:{checkout_id}" if checkout_id else None,
+        )
+    except PriceChangedError:
+        await callback.answer(
+            "Цены или состав каталога изменились. Оформите заказ заново из корзины.",
+            show_alert=True,
         )
+        return
     except ValueError:
         await callback.answer("Ваша корзина пуста.", show_alert=True)
         return
 
     message_data = prepare_summary_payload(data, customer, cart_data)
-    text = completion_text(message_data)
+    text = completion_text(message_data, cart_data)
 
     await edit_order_message(
         callback.message.bot,
@@ -929,9 +934,11 @@ async def submit_order(
     )
 
     admin_chat_id = parse_admin_chat_id(os.getenv("ADMIN_GROUP_ID"))
-    if admin_chat_id:
+    # Повторное нажатие: заказ уже создан и админы уже уведомлены
+    if admin_chat_id and created:
         admin_message = build_admin_notification(order.id, customer, cart_data)
-        with suppress(TelegramBadRequest):
+        # Занятая очередь админ-чата не должна срывать подтверждение заказа
+        with suppress(TelegramBadRequest, TelegramRetryAfter), background_sends():
             await callback.message.bot.send_message(admin_chat_id, admin_message)
 
     await callback.answer("Заказ отправлен! Мы свяжемся с вами в ближайшее время.")
@@ -1,26 +1,27 @@
-from string import punctuation
+from contextlib import suppress
 
 from aiogram import F, types, Router
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.filters import Command
 
 from filters.chat_types import ChatTypeFilter
-from common.restricted_words import restricted_words
+from utils.moderation import restricted_words_matcher
 
 
 user_group_router = Router()
 user_group_router.message.filter(ChatTypeFilter(["group", "supergroup"]))
 user_group_router.edited_message.filter(ChatTypeFilter(["group", "supergroup"]))
 
-def clean_text(text: str):
-    return text.translate(str.maketrans("", "", punctuation))
-
 
 @user_group_router.edited_message()
 @user_group_router.message()
 async def cleaner(message: types.Message):
-    if restricted_words.intersection(clean_text(message.text.lower()).split()):
-        await message.answer(
-            f"{message.from_user.first_name}, соблюддайте порядок в чате!"
-        )
+    # Один проход скомпилированного матчера (см. utils.moderation)
+    if restricted_words_matcher.find(message.text or message.caption):
+        # Удаление не ждёт лимита чата; предупреждение в занятой группе можно пропустить
         await message.delete()
-        # await message.chat.ban(message.from_user.id)
\ No newline at end of file
+        with suppress(TelegramRetryAfter):
+            await message.answer(
+                f"{message.from_user.first_name}, соблюддайте порядок в чате!"
+            )
+        # await message.chat.ban(message.from_user.id)
@@ -8,7 +8,7 @@ from database.orm_query import (
 )
 
 from filters.chat_types import ChatTypeFilter
-from handlers.menu_processing import get_menu_content
+from handlers.menu_processing import get_menu_content, remember_banner_file_id
 from kbds.inline import MenuCallBack, get_callback_btns
 
 
@@ -29,7 +29,8 @@ async def start_cmd(message: types.Message, session: AsyncSession):
 
     media, reply_markup = await get_menu_content(session, level=0, menu_name="main")
 
-    await message.answer_photo(media.media, caption=media.caption, reply_markup=reply_markup)
+    sent = await message.answer_photo(media.media, caption=media.caption, reply_markup=reply_markup)
+    remember_banner_file_id(media, sent)
 
 
 async def add_to_cart(callback: types.CallbackQuery, callback_data: MenuCallBack, session: AsyncSession):
@@ -62,5 +63,6 @@ async def user_menu(callback: types.CallbackQuery, callback_data: MenuCallBack,
         user_id=callback.from_user.id,
     )
 
-    await callback.message.edit_media(media=media, reply_markup=reply_markup)
+    sent = await callback.message.edit_media(media=media, reply_markup=reply_markup)
+    remember_banner_file_id(media, sent)
     await callback.answer()
\ No newline at end of file
@@ -1,5 +1,7 @@
+from functools import lru_cache
+
 from aiogram.filters.callback_data import CallbackData
-from aiogram.types import InlineKeyboardButton
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 
@@ -11,43 +13,118 @@ class MenuCallBack(CallbackData, prefix="menu"):
     product_id: int | None = None
 
 
+# Клавиатуры меню строятся на каждый переход, а меняются в них только
+# уровень, страница и id товара. Кешируются упакованные callback_data и
+# раскладки кнопок в виде кортежей (text, callback_data); aiogram-модели
+# изменяемые, поэтому InlineKeyboardMarkup создаётся заново на каждый вызов.
+
+# (text, callback_data)
+Button = tuple[str, str]
+Rows = tuple[tuple[Button, ...], ...]
+
+@lru_cache(maxsize=4096)
+def pack_menu(
+    level: int,
+    menu_name: str,
+    category: int | None = None,
+    page: int = 1,
+    product_id: int | None = None,
+) -> str:
+    """``MenuCallBack(...).pack()`` с мемоизацией."""
+    return MenuCallBack(
+        level=level, menu_name=menu_name, category=category, page=page, product_id=product_id
+    ).pack()
+
+
+def _menu_button(
+    text: str,
+    level: int,
+    menu_name: str,
+    category: int | None = None,
+    page: int = 1,
+    product_id: int | None = None,
+) -> Button:
+    return text, pack_menu(level, menu_name, category, page, product_id)
+
+
+def _adjust(buttons: list[Button], sizes: tuple[int, ...]) -> Rows:
+    # То же, что InlineKeyboardBuilder.adjust: последний размер - для остатка
+    sizes = sizes or (8,)
+    rows = []
+    position = 0
+    while position < len(buttons):
+        size = sizes[min(len(rows), len(sizes) - 1)]
+        rows.append(tuple(buttons[position : position + size]))
+        position += size
+    return tuple(rows)
+
+
+def _pagination_row(
+    pagination_btns: dict, level: int, page: int, category: int | None = None
+) -> tuple[Button, ...]:
+    row = []
+    for text, menu_name in pagination_btns.items():
+        if menu_name == "next":
+            row.append(_menu_button(text, level, menu_name, category, page + 1))
+        elif menu_name == "previous":
+            row.append(_menu_button(text, level, menu_name, category, page - 1))
+    return tuple(row)
+
+
+def _markup(*rows: tuple[Button, ...]) -> InlineKeyboardMarkup:
+    # Новые модели на каждый вызов: вызывающий код может их менять
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=text, callback_data=data) for text, data in row]
+            for row in rows
+            if row
+        ]
+    )
+
+
+_MAIN_BTNS = {
+    "Каталог 🛍️": "catalog",
+    "Корзина 🛒": "cart",
+    "О нас ℹ️": "about",
+    "Оплата 💳": "payment",
+    "Доставка ⛵": "shipping",
+}
+
+
 def get_user_main_btns(*, level: int, sizes: tuple[int] = (2,)):
-    keyboard = InlineKeyboardBuilder()
-    btns = {
-        "Каталог 🛍️": "catalog",
-        "Корзина 🛒": "cart",
-        "О нас ℹ️": "about",
-        "Оплата 💳": "payment",
-        "Доставка ⛵": "shipping",
-    }
-    for text, menu_name in btns.items():
+    # Раскладка зависит только от уровня - собирается один раз
+    return _markup(*_main_rows(level, tuple(sizes)))
+
+
+@lru_cache(maxsize=32)
+def _main_rows(level: int, sizes: tuple[int, ...]) -> Rows:
+    buttons = []
+    for text, menu_name in _MAIN_BTNS.items():
         if menu_name == 'catalog':
-            keyboard.add(InlineKeyboardButton(text=text,
-                                              callback_data=MenuCallBack(level=level + 1, menu_name=menu_name).pack()))
+            buttons.append(_menu_button(text, level + 1, menu_name))
         elif menu_name == 'cart':
-            keyboard.add(InlineKeyboardButton(text=text,
-                                              callback_data=MenuCallBack(level=3, menu_name=menu_name).pack()))
+            buttons.append(_menu_button(text, 3, menu_name))
         else:
-            keyboard.add(InlineKeyboardButton(text=text,
-                                              callback_data=MenuCallBack(level=level, menu_name=menu_name).pack()))
+            buttons.append(_menu_button(text, level, menu_name))
 
-    return keyboard.adjust(*sizes).as_markup()
+    return _adjust(buttons, sizes)
 
 
 def get_user_catalog_btns(*, level: int, categories: list, sizes: tuple[int] = (2,)):
-    keyboard = InlineKeyboardBuilder()
+    # Каталог отдаётся кортежем неизменяемых CategoryRecord - он и есть ключ кеша
+    return _markup(*_catalog_rows(level, tuple(categories), tuple(sizes)))
 
-    keyboard.add(InlineKeyboardButton(text='Назад',
-                                      callback_data=MenuCallBack(level=level - 1, menu_name='main').pack()))
-    keyboard.add(InlineKeyboardButton(text='Корзина 🛒',
-                                      callback_data=MenuCallBack(level=3, menu_name='cart').pack()))
 
+@lru_cache(maxsize=32)
+def _catalog_rows(level: int, categories: tuple, sizes: tuple[int, ...]) -> Rows:
+    buttons = [
+        _menu_button('Назад', level - 1, 'main'),
+        _menu_button('Корзина 🛒', 3, 'cart'),
+    ]
     for c in categories:
-        keyboard.add(InlineKeyboardButton(text=c.name,
-                                          callback_data=MenuCallBack(level=level + 1, menu_name=c.name,
-                                                                     category=c.id).pack()))
+        buttons.append(_menu_button(c.name, level + 1, c.name, c.id))
 
-    return keyboard.adjust(*sizes).as_markup()
+    return _adjust(buttons, sizes)
 
 
 def get_products_btns(
@@ -59,37 +136,21 @@ def get_products_btns(
         product_id: int,
         sizes: tuple[int] = (2, 1)
 ):
-    keyboard = InlineKeyboardBuilder()
+    buttons = [
+        _menu_button('Назад', level - 1, 'catalog'),
+        _menu_button('Корзина 🛒', 3, 'cart'),
+        _menu_button('Купить 💵', level, 'add_to_cart', product_id=product_id),
+    ]
 
-    keyboard.add(InlineKeyboardButton(text='Назад',
-                                      callback_data=MenuCallBack(level=level - 1, menu_name='catalog').pack()))
-    keyboard.add(InlineKeyboardButton(text='Корзина 🛒',
-                                      callback_data=MenuCallBack(level=3, menu_name='cart').pack()))
-    keyboard.add(InlineKeyboardButton(text='Купить 💵',
-                                      callback_data=MenuCallBack(level=level, menu_name='add_to_cart',
-                                                                 product_id=product_id).pack()))
+    return _markup(
+        *_adjust(buttons, sizes),
+        _pagination_row(pagination_btns, level, page, category),
+    )
 
-    keyboard.adjust(*sizes)
 
-    row = []
-    for text, menu_name in pagination_btns.items():
-        if menu_name == "next":
-            row.append(InlineKeyboardButton(text=text,
-                                            callback_data=MenuCallBack(
-                                                level=level,
-                                                menu_name=menu_name,
-                                                category=category,
-                                                page=page + 1).pack()))
-
-        elif menu_name == "previous":
-            row.append(InlineKeyboardButton(text=text,
-                                            callback_data=MenuCallBack(
-                                                level=level,
-                                                menu_name=menu_name,
-                                                category=category,
-                                                page=page - 1).pack()))
-
-    return keyboard.row(*row).as_markup()
+_CART_HOME_BTN = _menu_button('На главную 🏠', 0, 'main')
+# Изменено на отдельный callback_data
+_START_ORDER_BTN = ('Заказать', 'start_order')
 
 
 def get_user_cart(
@@ -100,46 +161,20 @@ def get_user_cart(
         product_id: int | None,
         sizes: tuple[int] = (3,)
 ):
-    keyboard = InlineKeyboardBuilder()
     if page:
-        keyboard.add(InlineKeyboardButton(text='Удалить',
-                                          callback_data=MenuCallBack(level=level, menu_name='delete',
-                                                                     product_id=product_id, page=page).pack()))
-        keyboard.add(InlineKeyboardButton(text='-1',
-                                          callback_data=MenuCallBack(level=level, menu_name='decrement',
-                                                                     product_id=product_id, page=page).pack()))
-        keyboard.add(InlineKeyboardButton(text='+1',
-                                          callback_data=MenuCallBack(level=level, menu_name='increment',
-                                                                     product_id=product_id, page=page).pack()))
-
-        keyboard.adjust(*sizes)
-
-        row = []
-        for text, menu_name in pagination_btns.items():
-            if menu_name == "next":
-                row.append(InlineKeyboardButton(text=text,
-                                                callback_data=MenuCallBack(level=level, menu_name=menu_name,
-                                                                           page=page + 1).pack()))
-            elif menu_name == "previous":
-                row.append(InlineKeyboardButton(text=text,
-                                                callback_data=MenuCallBack(level=level, menu_name=menu_name,
-                                                                           page=page - 1).pack()))
-
-        keyboard.row(*row)
-
-        row2 = [
-            InlineKeyboardButton(text='На главную 🏠',
-                                 callback_data=MenuCallBack(level=0, menu_name='main').pack()),
-            InlineKeyboardButton(text='Заказать',
-                                 callback_data='start_order')  # Изменено на отдельный callback_data
+        buttons = [
+            _menu_button('Удалить', level, 'delete', product_id=product_id, page=page),
+            _menu_button('-1', level, 'decrement', product_id=product_id, page=page),
+            _menu_button('+1', level, 'increment', product_id=product_id, page=page),
         ]
-        return keyboard.row(*row2).as_markup()
-    else:
-        keyboard.add(
-            InlineKeyboardButton(text='На главную 🏠',
-                                 callback_data=MenuCallBack(level=0, menu_name='main').pack()))
 
-        return keyboard.adjust(*sizes).as_markup()
+        return _markup(
+            *_adjust(buttons, sizes),
+            _pagination_row(pagination_btns, level, page),
+            (_CART_HOME_BTN, _START_ORDER_BTN),
+        )
+    else:
+        return _markup(*_adjust([_CART_HOME_BTN], tuple(sizes)))
 
 
 def get_callback_btns(*, btns: dict[str, str], sizes: tuple[int, ...] = (2,)):
@@ -4,6 +4,7 @@ import logging
 from aiogram import Bot, Dispatcher, types
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.filters import ExceptionTypeFilter
 
 from dotenv import find_dotenv, load_dotenv
 
@@ -15,22 +16,36 @@ logging.basicConfig(
 )
 
 from middlewares.db import DataBaseSession
-from database.engine import create_db, drop_db, session_maker
+from middlewares.outbound import OutboundQueueTimeout, OutboundRateLimiter, outbound_timeout_handler
+from database.engine import create_db, drop_db, get_pool_metrics, log_pool_metrics, session_maker
+from database.fsm_storage import create_fsm_storage
 
 from handlers.user_private import user_private_router
 from handlers.user_group import user_group_router
 from handlers.admin_hendlers import admin_router, group_admin_router
 from handlers.order_processing import order_router
+from utils.env import env_float
+from utils.geocache import geocode_cache
+from utils.http import close_http_client, open_http_client
+from utils.telegraph_jobs import telegraph_jobs
+from utils.webhook import run_webhook
 
 # ALLOWED_UPDATES = ['message', 'edited_message', 'callback_query']
 
+# polling | webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+
 # ✅ Новый способ передачи parse_mode
 bot = Bot(
     token=os.getenv('TOKEN'),
     default=DefaultBotProperties(parse_mode=ParseMode.HTML)
 )
+# Все исходящие запросы в чаты идут через общий планировщик с лимитами
+bot.session.middleware(OutboundRateLimiter.from_env())
 
-dp = Dispatcher()
+dp = Dispatcher(storage=create_fsm_storage())
+# Запрос, не дождавшийся очереди занятого чата, не считается сбоем обработчика
+dp.errors.register(outbound_timeout_handler, ExceptionTypeFilter(OutboundQueueTimeout))
 
 dp.include_router(user_private_router)
 dp.include_router(admin_router)
@@ -38,11 +53,24 @@ dp.include_router(group_admin_router)
 dp.include_router(user_group_router)
 dp.include_router(order_router)
 
+# Интервал (сек) записи метрик пула БД в лог, 0 - выключено
+POOL_METRICS_INTERVAL = env_float("DB_POOL_METRICS_INTERVAL", 0)
+background_tasks: set[asyncio.Task] = set()
+
 async def on_startup(bot):
     # await drop_db()
     await create_db()
+    await open_http_client()
+    if POOL_METRICS_INTERVAL > 0:
+        background_tasks.add(asyncio.create_task(log_pool_metrics(POOL_METRICS_INTERVAL)))
 
 async def on_shutdown(bot):
+    for task in background_tasks:
+        task.cancel()
+    await telegraph_jobs.close()
+    await close_http_client()
+    geocode_cache.close()
+    logging.info("DB pool metrics: %s", get_pool_metrics())
     print('бот лег')
 
 async def main():
@@ -51,6 +79,11 @@ async def main():
 
     dp.update.middleware(DataBaseSession(session_pool=session_maker))
 
+    if BOT_MODE == "webhook":
+        # Параметры сервера берутся из WEBHOOK_* переменных окружения
+        await run_webhook(dp, bot)
+        return
+
     await bot.delete_webhook(drop_pending_updates=True)
     # await bot.delete_my_commands(scope=types.BotCommandScopeAllPrivateChats())
     # await bot.set_my_commands(commands=private, scope=types.BotCommandScopeAllPrivateChats())
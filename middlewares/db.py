@@ -3,7 +3,35 @@ from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import Message, TelegramObject
 
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+class LazySession:
+    """Прокси AsyncSession: сессия создаётся при первом обращении.
+
+    Апдейты, которые не работают с БД (чистка групп, шаги FSM),
+    не создают сессию и не берут соединение из пула.
+    """
+
+    __slots__ = ("_session_pool", "_session")
+
+    def __init__(self, session_pool: async_sessionmaker):
+        self._session_pool = session_pool
+        self._session: AsyncSession | None = None
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._session is None:
+            self._session = self._session_pool()
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
 
 class DataBaseSession(BaseMiddleware):
@@ -17,9 +45,12 @@ class DataBaseSession(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        async with self.session_pool() as session:
-            data['session'] = session
+        session = LazySession(self.session_pool)
+        data['session'] = session
+        try:
             return await handler(event, data)
+        finally:
+            await session.close()
 
 
 # class CounterMiddleware(BaseMiddleware):
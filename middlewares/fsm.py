@@ -0,0 +1,112 @@
+import copy
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType
+from aiogram.types import TelegramObject
+
+
+_UNSET = object()
+
+
+class FSMSnapshot(FSMContext):
+    """FSMContext, который работает с копией состояния в памяти.
+
+    Данные читаются из хранилища один раз (при первом обращении),
+    изменения копятся в памяти и записываются одним ``flush()``
+    в конце обработки апдейта.
+    """
+
+    def __init__(self, context: FSMContext, raw_state: Optional[str] | object = _UNSET) -> None:
+        super().__init__(storage=context.storage, key=context.key)
+        self._state = raw_state
+        self._data: Dict[str, Any] | None = None
+        self._state_changed = False
+        self._data_changed = False
+
+    async def _load(self) -> None:
+        get_record = getattr(self.storage, "get_record", None)
+        if self._state is _UNSET and self._data is None and get_record is not None:
+            self._state, self._data = await get_record(self.key)
+            return
+        if self._state is _UNSET:
+            self._state = await self.storage.get_state(key=self.key)
+        if self._data is None:
+            self._data = await self.storage.get_data(key=self.key)
+
+    async def set_state(self, state: StateType = None) -> None:
+        self._state = state.state if isinstance(state, State) else state
+        self._state_changed = True
+
+    async def get_state(self) -> Optional[str]:
+        if self._state is _UNSET:
+            await self._load()
+        return self._state
+
+    async def set_data(self, data: Mapping[str, Any]) -> None:
+        self._data = copy.deepcopy(dict(data))
+        self._data_changed = True
+
+    async def get_data(self) -> Dict[str, Any]:
+        if self._data is None:
+            await self._load()
+        return copy.deepcopy(self._data)
+
+    async def get_value(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        if self._data is None:
+            await self._load()
+        return copy.deepcopy(self._data.get(key, default))
+
+    async def update_data(
+        self, data: Optional[Mapping[str, Any]] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        if data:
+            kwargs.update(data)
+        if self._data is None:
+            await self._load()
+        self._data.update(copy.deepcopy(kwargs))
+        self._data_changed = True
+        return copy.deepcopy(self._data)
+
+    async def clear(self) -> None:
+        self._state = None
+        self._data = {}
+        self._state_changed = self._data_changed = True
+
+    async def flush(self) -> None:
+        """Записать накопленные изменения в хранилище."""
+        state_changed, data_changed = self._state_changed, self._data_changed
+        self._state_changed = self._data_changed = False
+        if state_changed and data_changed:
+            set_record = getattr(self.storage, "set_record", None)
+            if set_record is not None:
+                await set_record(self.key, self._state, self._data)
+                return
+        if state_changed:
+            await self.storage.set_state(key=self.key, state=self._state)
+        if data_changed:
+            await self.storage.set_data(key=self.key, data=self._data)
+
+
+class FSMSnapshotMiddleware(BaseMiddleware):
+    """Подменяет ``state`` на FSMSnapshot на время обработки апдейта."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        context = data.get("state")
+        if context is None or isinstance(context, FSMSnapshot):
+            return await handler(event, data)
+
+        # Состояние уже прочитано FSMContextMiddleware - берём его оттуда
+        snapshot = FSMSnapshot(context, data.get("raw_state", _UNSET))
+        data["state"] = snapshot
+        # Если обработчик упал, частично изменённое состояние не сохраняем
+        result = await handler(event, data)
+        await snapshot.flush()
+        return result
@@ -0,0 +1,349 @@
+"""Планировщик исходящих запросов к Telegram Bot API.
+
+Подключается как request-middleware сессии бота. Отправки в чат
+(``send*``, копирование, пересылка) проходят через общий лимит бота и
+отдельный лимит чата; правки и удаления сообщений - только через общий,
+чтение (``get*``) не лимитируется. Правки, которые видит пользователь,
+обслуживаются раньше обычных отправок, а фоновые рассылки (уведомления
+админам и т.п.) - в последнюю очередь. На ``TelegramRetryAfter`` чат
+ставится на паузу, и запрос повторяется.
+
+Ожидание очереди ограничено ``max_wait``: дольше обработчик не ждёт и
+получает ``OutboundQueueTimeout`` (подкласс ``TelegramRetryAfter``), чтобы
+один занятый чат не держал все воркеры. Обработчики его не ловят:
+``outbound_timeout_handler`` на уровне диспетчера пишет в лог и гасит
+ошибку, как будто запрос просто не ушёл.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Iterator
+
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import ErrorEvent
+
+from utils.env import env_float, env_int
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше - раньше
+PRIORITY_EDIT = 0
+PRIORITY_SEND = 1
+PRIORITY_BACKGROUND = 2
+
+_priority: ContextVar[int | None] = ContextVar("outbound_priority", default=None)
+
+
+@contextmanager
+def background_sends() -> Iterator[None]:
+    """Запросы внутри блока идут с фоновым приоритетом."""
+    token = _priority.set(PRIORITY_BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+# Отправки, на которые действует лимит Telegram на чат
+_CHAT_LIMITED_PREFIXES = ("Send", "Copy", "Forward")
+# Чтение данных лимиты отправки не расходует
+_READ_PREFIXES = ("Get",)
+
+
+def is_chat_limited(method: TelegramMethod[Any]) -> bool:
+    return type(method).__name__.startswith(_CHAT_LIMITED_PREFIXES)
+
+
+def is_read(method: TelegramMethod[Any]) -> bool:
+    return type(method).__name__.startswith(_READ_PREFIXES)
+
+
+def method_priority(method: TelegramMethod[Any]) -> int:
+    explicit = _priority.get()
+    if explicit is not None:
+        return explicit
+    name = type(method).__name__
+    if name.startswith("Edit") or name.startswith("Delete"):
+        return PRIORITY_EDIT
+    return PRIORITY_SEND
+
+
+class OutboundQueueTimeout(TelegramRetryAfter):
+    """Запрос не дождался очереди за ``max_wait`` и не был отправлен."""
+
+
+async def outbound_timeout_handler(event: ErrorEvent) -> bool:
+    """Обработчик ошибок диспетчера: занятый чат - не сбой обработчика."""
+    logger.info("Update %s dropped: %s", event.update.update_id, event.exception)
+    callback = event.update.callback_query
+    if callback is not None:
+        # answerCallbackQuery лимитом чата не ограничен - снимаем «часики» с кнопки
+        with suppress(TelegramBadRequest):
+            await callback.answer()
+    return True
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до появления токена (0 - токен есть)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+# (priority, seq, chat_id или None - только общий лимит, future)
+_Waiter = tuple[int, int, int | str | None, asyncio.Future]
+
+
+class OutboundScheduler:
+    """Выдаёт разрешения на запросы в порядке приоритета с учётом лимитов."""
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        private_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        chat_burst: float = 3.0,
+        max_chats: int = 10_000,
+    ) -> None:
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: OrderedDict[int | str, TokenBucket] = OrderedDict()
+        # Общая очередь (куча)
+        self._waiters: list[_Waiter] = []
+        # Ожидающие чатов, у которых пока нет токена, и моменты их готовности
+        self._parked: dict[int | str, list[_Waiter]] = {}
+        self._sleeping: set[int | str] = set()
+        self._timers: list[tuple[float, int | str]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._pump_task: asyncio.Task[None] | None = None
+
+    def _bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные id и @username - группы и каналы
+            is_private = isinstance(chat_id, int) and chat_id > 0
+            rate = self.private_rate if is_private else self.group_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def pause(self, chat_id: int | str, seconds: float) -> None:
+        self._bucket(chat_id).pause(seconds)
+
+    async def acquire(
+        self, chat_id: int | str | None, priority: int, timeout: float | None = None
+    ) -> None:
+        """Дождаться разрешения; ``asyncio.TimeoutError`` - если дольше ``timeout``."""
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), chat_id, future)
+        if chat_id is not None and chat_id in self._parked:
+            # Чат уже стоит в очереди - ждём за его первым запросом
+            heapq.heappush(self._parked[chat_id], entry)
+        else:
+            heapq.heappush(self._waiters, entry)
+        self._wakeup.set()
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        # wait_for отменяет future, и _grant выбрасывает его при извлечении
+        await asyncio.wait_for(future, timeout)
+
+    async def _pump(self) -> None:
+        while self._waiters or self._parked:
+            self._wakeup.clear()
+            now = time.monotonic()
+            wait = self._global.delay(now)
+            if wait <= 0:
+                wait = self._grant(now)
+                if wait is None:
+                    continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant(self, now: float) -> float | None:
+        """Выдать токен первому готовому ожидающему.
+
+        Возвращает None, если токен выдан или ждать некого, иначе время
+        до ближайшей готовности. Готовые отменённые записи снимаются с вершины
+        кучи, а ожидающие чатов без токена откладываются в ``_parked``, так что
+        выдача стоит O(log n).
+        """
+        # Чаты, у которых истекла пауза, возвращают в очередь первого ожидающего
+        while self._timers and self._timers[0][0] <= now:
+            _, chat_id = heapq.heappop(self._timers)
+            if chat_id in self._sleeping:
+                self._sleeping.discard(chat_id)
+                self._release(chat_id)
+
+        while self._waiters:
+            entry = heapq.heappop(self._waiters)
+            _, _, chat_id, future = entry
+            if future.done():
+                # Отменён по таймауту - место в очереди чата переходит следующему
+                self._release(chat_id)
+                continue
+            bucket = self._bucket(chat_id) if chat_id is not None else None
+            wait = bucket.delay(now) if bucket is not None else 0.0
+            if wait > 0:
+                self._park(entry, now + wait)
+                continue
+            if bucket is not None:
+                bucket.take(now)
+            self._global.take(now)
+            future.set_result(None)
+            self._release(chat_id)
+            return None
+        return self._timers[0][0] - now if self._timers else None
+
+    def _park(self, entry: _Waiter, ready_at: float) -> None:
+        # Чат без токена: его ожидающие ждут в стороне и не пересортировываются
+        chat_id = entry[2]
+        heapq.heappush(self._parked.setdefault(chat_id, []), entry)
+        if chat_id not in self._sleeping:
+            self._sleeping.add(chat_id)
+            heapq.heappush(self._timers, (ready_at, chat_id))
+
+    def _release(self, chat_id: int | str | None) -> None:
+        # Следующий ожидающий чата переходит в общую очередь
+        if chat_id is None or chat_id in self._sleeping:
+            return
+        parked = self._parked.get(chat_id)
+        if parked is None:
+            return
+        while parked and parked[0][3].done():
+            heapq.heappop(parked)
+        if parked:
+            heapq.heappush(self._waiters, heapq.heappop(parked))
+        if not parked:
+            del self._parked[chat_id]
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """Request-middleware: лимиты Telegram и повтор после RetryAfter."""
+
+    def __init__(
+        self,
+        scheduler: OutboundScheduler | None = None,
+        max_retries: int = 3,
+        max_wait: float = 5.0,
+    ) -> None:
+        self.scheduler = scheduler or OutboundScheduler()
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+
+    @classmethod
+    def from_env(cls) -> "OutboundRateLimiter":
+        scheduler = OutboundScheduler(
+            global_rate=env_float("TG_GLOBAL_RATE", 30.0),
+            private_rate=env_float("TG_CHAT_RATE", 1.0),
+            group_rate=env_float("TG_GROUP_RATE", 20 / 60),
+            chat_burst=env_float("TG_CHAT_BURST", 3.0),
+        )
+        return cls(
+            scheduler,
+            max_retries=env_int("TG_MAX_RETRIES", 3),
+            max_wait=env_float("TG_MAX_WAIT", 5.0),
+        )
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or is_read(method):
+            # getUpdates, answerCallbackQuery, getChatMember и т.п. не лимитируем
+            return await make_request(bot, method)
+
+        # Лимит чата - только для отправок; правки и удаления идут по общему
+        limited_chat = chat_id if is_chat_limited(method) else None
+        priority = method_priority(method)
+        deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            try:
+                await self.scheduler.acquire(
+                    limited_chat, priority, max(0.0, deadline - time.monotonic())
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Outbound queue for chat %s is busy, %s dropped after %.1f s",
+                    chat_id,
+                    type(method).__name__,
+                    self.max_wait,
+                )
+                raise OutboundQueueTimeout(
+                    method=method,
+                    message="Outbound queue wait exceeded",
+                    retry_after=max(1, math.ceil(self.max_wait)),
+                ) from None
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as error:
+                attempt += 1
+                if limited_chat is not None:
+                    self.scheduler.pause(limited_chat, error.retry_after)
+                # Повторяем, только если успеваем в отведённое время ожидания
+                if (
+                    attempt > self.max_retries
+                    or time.monotonic() + error.retry_after > deadline
+                ):
+                    raise
+                logger.warning(
+                    "Flood control on %s in chat %s, retry in %s s",
+                    type(method).__name__,
+                    chat_id,
+                    error.retry_after,
+                )
+                if limited_chat is None:
+                    await asyncio.sleep(error.retry_after)
@@ -0,0 +1,28 @@
+"""add (category_id, id) index to product
+
+Revision ID: 3f1e7a9c2b64
+Revises: a76ea5d9442c
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1e7a9c2b64'
+down_revision: Union[str, Sequence[str], None] = 'a76ea5d9442c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_product_category_id_id', 'product', ['category_id', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_product_category_id_id', table_name='product')
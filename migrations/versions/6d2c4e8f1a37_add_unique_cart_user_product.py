@@ -0,0 +1,52 @@
+"""add unique (user_id, product_id) index to cart
+
+Revision ID: 6d2c4e8f1a37
+Revises: 3f1e7a9c2b64
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2c4e8f1a37'
+down_revision: Union[str, Sequence[str], None] = '3f1e7a9c2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 🔹 Схлопываем дубли, созданные двойными нажатиями: количество
+    # суммируется в строку с минимальным id, остальные удаляются
+    op.execute(
+        """
+        UPDATE cart SET quantity = (
+            SELECT SUM(c2.quantity) FROM cart c2
+            WHERE c2.user_id = cart.user_id AND c2.product_id = cart.product_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cart GROUP BY user_id, product_id HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM cart WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id FROM cart GROUP BY user_id, product_id
+            ) AS keep
+        )
+        """
+    )
+    op.create_index(
+        'uq_cart_user_id_product_id', 'cart', ['user_id', 'product_id'], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_cart_user_id_product_id', table_name='cart')
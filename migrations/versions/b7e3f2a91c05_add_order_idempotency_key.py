@@ -0,0 +1,32 @@
+"""add idempotency_key to order
+
+Revision ID: b7e3f2a91c05
+Revises: 9a4b1c7d3e52
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3f2a91c05'
+down_revision: Union[str, Sequence[str], None] = '9a4b1c7d3e52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('order', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_index(
+        'uq_order_idempotency_key', 'order', ['idempotency_key'], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_order_idempotency_key', table_name='order')
+    op.drop_column('order', 'idempotency_key')
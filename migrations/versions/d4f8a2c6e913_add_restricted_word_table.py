@@ -0,0 +1,36 @@
+"""add restricted_word table for the group cleaner
+
+Revision ID: d4f8a2c6e913
+Revises: b7e3f2a91c05
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f8a2c6e913'
+down_revision: Union[str, Sequence[str], None] = 'b7e3f2a91c05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'restricted_word',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('word', sa.String(length=100), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.Column('updated', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('word'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('restricted_word')
@@ -1,3 +1,3 @@
-from .location import get_address_from_coords, prettify_address
+from .location import get_address_from_coords, prettify_address, reverse_geocode
 
-__all__ = ["get_address_from_coords", "prettify_address"]
+__all__ = ["get_address_from_coords", "prettify_address", "reverse_geocode"]
@@ -0,0 +1,249 @@
+"""Офлайн обратный геокодер по локальному справочнику адресов.
+
+Справочник (выгрузка адресных точек OSM) собирается в компактный
+бинарный файл с grid-индексом (ячейки 0.002°, ~200 м) и открывается
+через ``mmap``: старт мгновенный, а поиск ближайшей точки - это
+бинарный поиск ячеек и перебор ближайших из них, пока они могут
+содержать точку ближе уже найденной; сеть не нужна.
+
+Сборка файла из TSV с заголовком (lat, lon и любые поля из ``FIELDS``)::
+
+    python -m utils.gazetteer addresses.tsv gazetteer.bin
+"""
+from __future__ import annotations
+
+import csv
+import math
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Iterable, Mapping
+
+__all__ = ["FIELDS", "Gazetteer", "build_gazetteer"]
+
+# Поля адреса в терминах Nominatim (их понимает _build_preferred_address)
+FIELDS = ("road", "house_number", "suburb", "city", "state", "postcode", "country")
+
+_MAGIC = b"GZT1"
+_HEADER = struct.Struct("<4sHHdIII")
+_COORD_SCALE = 1_000_000
+_METERS_PER_DEGREE = 111_320.0
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _cell(lat: float, lon: float, cell_size: float) -> tuple[int, int]:
+    return math.floor((lat + 90.0) / cell_size), math.floor((lon + 180.0) / cell_size)
+
+
+def _cell_key(row: int, col: int, cell_size: float) -> int:
+    return row * (math.ceil(360.0 / cell_size) + 1) + col
+
+
+def build_gazetteer(
+    points: Iterable[Mapping[str, object]],
+    path: str | Path,
+    cell_size: float = 0.002,
+) -> int:
+    """Собрать файл справочника. Возвращает число точек."""
+    strings: dict[str, int] = {"": 0}
+    entries: list[tuple[int, int, int, list[int]]] = []
+    for point in points:
+        lat = float(point["lat"])
+        lon = float(point["lon"])
+        field_ids = []
+        for field in FIELDS:
+            value = str(point.get(field) or "").strip()
+            field_ids.append(strings.setdefault(value, len(strings)))
+        row, col = _cell(lat, lon, cell_size)
+        entries.append(
+            (
+                _cell_key(row, col, cell_size),
+                round(lat * _COORD_SCALE),
+                round(lon * _COORD_SCALE),
+                field_ids,
+            )
+        )
+    entries.sort(key=lambda entry: entry[0])
+
+    cell_keys = array("q")
+    cell_starts = array("I")
+    lats = array("i")
+    lons = array("i")
+    fields = array("I")
+    for index, (key, lat, lon, field_ids) in enumerate(entries):
+        if not cell_keys or cell_keys[-1] != key:
+            cell_keys.append(key)
+            cell_starts.append(index)
+        lats.append(lat)
+        lons.append(lon)
+        fields.extend(field_ids)
+    cell_starts.append(len(entries))
+
+    str_offsets = array("I", [0])
+    blob = bytearray()
+    for value in strings:  # порядок вставки = id строки
+        blob += value.encode("utf-8")
+        str_offsets.append(len(blob))
+
+    sections = [cell_keys, cell_starts, lats, lons, fields, str_offsets, bytes(blob)]
+    with open(path, "wb") as file:
+        file.write(
+            _HEADER.pack(
+                _MAGIC, 1, len(FIELDS), cell_size, len(entries), len(cell_keys), len(strings)
+            )
+        )
+        for section in sections:
+            file.write(b"\0" * (_align(file.tell()) - file.tell()))
+            file.write(section if isinstance(section, bytes) else section.tobytes())
+    return len(entries)
+
+
+class Gazetteer:
+    """Справочник, отображённый в память (read-only)."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = view = memoryview(self._mmap)
+
+        magic, version, n_fields, cell_size, n_points, n_cells, n_strings = (
+            _HEADER.unpack_from(view)
+        )
+        if magic != _MAGIC or version != 1 or n_fields != len(FIELDS):
+            raise ValueError(f"{self.path}: неподдерживаемый формат справочника")
+        self.cell_size = cell_size
+        self.size = n_points
+
+        offset = _HEADER.size
+
+        def section(fmt: str, count: int, itemsize: int) -> memoryview:
+            nonlocal offset
+            offset = _align(offset)
+            chunk = view[offset : offset + count * itemsize].cast(fmt)
+            offset += count * itemsize
+            return chunk
+
+        self._cell_keys = section("q", n_cells, 8)
+        self._cell_starts = section("I", n_cells + 1, 4)
+        self._lats = section("i", n_points, 4)
+        self._lons = section("i", n_points, 4)
+        self._fields = section("I", n_points * n_fields, 4)
+        self._str_offsets = section("I", n_strings + 1, 4)
+        offset = _align(offset)
+        self._blob = view[offset:]
+
+    def _string(self, string_id: int) -> str:
+        start, end = self._str_offsets[string_id], self._str_offsets[string_id + 1]
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+    def nearest(self, lat: float, lon: float, max_distance: float = 300.0) -> dict[str, str] | None:
+        """Адрес ближайшей точки в пределах ``max_distance`` метров."""
+        row, col = _cell(lat, lon, self.cell_size)
+        scale_lon = math.cos(math.radians(lat))
+        n_cols = math.ceil(360.0 / self.cell_size)
+        # Ячейки вокруг точки, покрывающие радиус поиска. По долготе ячейка
+        # уже в cos(lat) раз, поэтому столбцов нужно больше, чем строк; у
+        # полюса окно ограничено одним оборотом - дальше столбцы повторяются.
+        cell_meters = self.cell_size * _METERS_PER_DEGREE
+        row_reach = max(1, math.ceil(max_distance / cell_meters))
+        col_reach = min(
+            max(1, math.ceil(max_distance / (cell_meters * max(scale_lon, 1e-6)))),
+            (n_cols - 1) // 2,
+        )
+        lat_i = lat * _COORD_SCALE
+        lon_i = lon * _COORD_SCALE
+        cell_i = self.cell_size * _COORD_SCALE
+        full_turn = 360 * _COORD_SCALE
+        keys = self._cell_keys
+        # Ключи ячеек строки идут подряд (см. _cell_key)
+        row_stride = _cell_key(1, 0, self.cell_size)
+
+        # Непустые ячейки каждой строки окна находятся бинарным поиском по
+        # диапазону ключей, пустые ничего не стоят. Окно через ±180° делится
+        # на куски, а долготы за границей сдвигаются на полный оборот.
+        cells = []
+        for cell_row in range(row - row_reach, row + row_reach + 1):
+            south = cell_row * cell_i - 90 * _COORD_SCALE
+            if lat_i < south:
+                dy = south - lat_i
+            elif lat_i > south + cell_i:
+                dy = lat_i - south - cell_i
+            else:
+                dy = 0.0
+            dy *= dy
+            row_key = cell_row * row_stride
+            first, last = col - col_reach, col + col_reach
+            for turn in range(first // n_cols, last // n_cols + 1):
+                start = max(first, turn * n_cols) - turn * n_cols
+                stop = min(last, turn * n_cols + n_cols - 1) - turn * n_cols
+                # Долгота точки в системе отсчёта этого куска окна
+                lon_ref = lon_i - turn * full_turn
+                for cell in range(bisect_left(keys, row_key + start), bisect_right(keys, row_key + stop)):
+                    west = (keys[cell] - row_key) * cell_i - 180 * _COORD_SCALE
+                    if lon_ref < west:
+                        dx = (west - lon_ref) * scale_lon
+                    elif lon_ref > west + cell_i:
+                        dx = (lon_ref - west - cell_i) * scale_lon
+                    else:
+                        dx = 0.0
+                    cells.append((dx * dx + dy, cell, lon_ref))
+        # По возрастанию нижней оценки расстояния: как только оценка больше
+        # найденного минимума, остальные ячейки не смотрим.
+        cells.sort()
+
+        best_index = -1
+        best_distance = (max_distance / _METERS_PER_DEGREE * _COORD_SCALE) ** 2
+        lats, lons = self._lats, self._lons
+        starts = self._cell_starts
+        for bound, cell, lon_ref in cells:
+            if bound > best_distance:
+                break
+            for index in range(starts[cell], starts[cell + 1]):
+                dy = lats[index] - lat_i
+                dx = (lons[index] - lon_ref) * scale_lon
+                distance = dx * dx + dy * dy
+                if distance <= best_distance:
+                    best_index, best_distance = index, distance
+
+        if best_index < 0:
+            return None
+        base = best_index * len(FIELDS)
+        address = {}
+        for position, field in enumerate(FIELDS):
+            value = self._string(self._fields[base + position])
+            if value:
+                address[field] = value
+        return address
+
+    def close(self) -> None:
+        for chunk in (
+            self._cell_keys,
+            self._cell_starts,
+            self._lats,
+            self._lons,
+            self._fields,
+            self._str_offsets,
+            self._blob,
+            self._view,
+        ):
+            chunk.release()
+        self._mmap.close()
+
+
+def _read_tsv(path: str) -> Iterable[dict[str, str]]:
+    with open(path, newline="", encoding="utf-8") as file:
+        yield from csv.DictReader(file, delimiter="\t")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m utils.gazetteer <addresses.tsv> <gazetteer.bin>")
+    count = build_gazetteer(_read_tsv(sys.argv[1]), sys.argv[2])
+    print(f"{count} points -> {sys.argv[2]}")
@@ -0,0 +1,141 @@
+"""Кеш обратного геокодирования: LRU в памяти + локальный SQLite-файл.
+
+Координаты квантуются до 4 знаков после запятой (~10 м), поэтому
+повторные заказы из того же дома и соседние точки не ходят в Nominatim.
+Хранится уже «причёсанный» адрес (результат ``prettify_address``).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from utils.env import env_float, env_int
+
+__all__ = ["GeoCache", "geocode_cache"]
+
+DEFAULT_PATH = Path(__file__).resolve().parents[1] / "geocode_cache.sqlite3"
+
+
+class GeoCache:
+    def __init__(
+        self,
+        path: str | Path | None,
+        ttl: float = 30 * 86400,
+        maxsize: int = 10_000,
+        precision: int = 4,
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.precision = precision
+        # key -> (expires_at по time.time(), адрес)
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._puts = 0
+
+    def key(self, lat: float, lon: float) -> str:
+        return f"{lat:.{self.precision}f},{lon:.{self.precision}f}"
+
+    # память
+
+    def _memory_get(self, key: str, now: float) -> str | None:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return entry[1]
+
+    def _memory_put(self, key: str, expires_at: float, address: str) -> None:
+        self._memory[key] = (expires_at, address)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    # SQLite (блокирующие вызовы - выполняются в пуле потоков)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "key TEXT PRIMARY KEY, address TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.execute("DELETE FROM geocode WHERE expires_at <= ?", (time.time(),))
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _db_get(self, key: str, now: float) -> tuple[float, str] | None:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT expires_at, address FROM geocode WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+        return row
+
+    def _db_put(self, key: str, expires_at: float, address: str, purge: bool) -> None:
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO geocode (key, address, expires_at) VALUES (?, ?, ?)",
+                (key, address, expires_at),
+            )
+            if purge:
+                db.execute("DELETE FROM geocode WHERE expires_at <= ?", (time.time(),))
+            db.commit()
+
+    # API
+
+    async def get(self, lat: float, lon: float) -> str | None:
+        key = self.key(lat, lon)
+        now = time.time()
+        address = self._memory_get(key, now)
+        if address is not None or self.path is None:
+            return address
+        try:
+            row = await asyncio.to_thread(self._db_get, key, now)
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        self._memory_put(key, row[0], row[1])
+        return row[1]
+
+    async def put(self, lat: float, lon: float, address: str) -> None:
+        key = self.key(lat, lon)
+        expires_at = time.time() + self.ttl
+        self._memory_put(key, expires_at, address)
+        if self.path is None:
+            return
+        # Просроченные строки чистим раз в 100 записей
+        self._puts += 1
+        try:
+            await asyncio.to_thread(self._db_put, key, expires_at, address, self._puts % 100 == 0)
+        except sqlite3.Error:
+            pass
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# GEOCODE_CACHE_PATH="" - только кеш в памяти
+_path_env = os.getenv("GEOCODE_CACHE_PATH")
+geocode_cache = GeoCache(
+    DEFAULT_PATH if _path_env is None else (_path_env or None),
+    ttl=env_float("GEOCODE_CACHE_TTL", 30 * 86400),
+    maxsize=env_int("GEOCODE_CACHE_SIZE", 10_000),
+)
@@ -0,0 +1,52 @@
+"""Общий HTTP-клиент приложения (Nominatim, Telegraph).
+
+Один ``httpx.AsyncClient`` с пулом keep-alive соединений открывается в
+``on_startup`` и закрывается в ``on_shutdown``, поэтому повторные запросы
+к тем же хостам не платят за TCP/TLS-рукопожатие.
+"""
+from __future__ import annotations
+
+import importlib.util
+
+import httpx
+
+from utils.env import env_bool, env_float, env_int
+
+__all__ = ["close_http_client", "get_http_client", "open_http_client"]
+
+_client: httpx.AsyncClient | None = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=env_int("HTTP_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=env_int("HTTP_MAX_KEEPALIVE", 10),
+        keepalive_expiry=env_float("HTTP_KEEPALIVE_EXPIRY", 30.0),
+    )
+    timeout = httpx.Timeout(
+        env_float("HTTP_TIMEOUT", 10.0),
+        connect=env_float("HTTP_CONNECT_TIMEOUT", 5.0),
+        pool=env_float("HTTP_POOL_TIMEOUT", 5.0),
+    )
+    # HTTP/2 требует пакет h2
+    http2 = env_bool("HTTP_HTTP2", True) and importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий клиент; создаётся лениво, если on_startup ещё не отработал."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def open_http_client() -> httpx.AsyncClient:
+    return get_http_client()
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
@@ -1,9 +1,20 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import os
+import time
 from typing import Any
 
 import httpx
 
+from utils.env import env_bool, env_float
+from utils.gazetteer import Gazetteer
+from utils.geocache import geocode_cache
+from utils.http import get_http_client
+
+
+logger = logging.getLogger(__name__)
 
 _USER_AGENT = "ShopezakazBot/1.0 (https://example.com)"
 
@@ -21,13 +32,12 @@ async def get_address_from_coords(lat: float, lon: float) -> str | None:
     headers = {"User-Agent": _USER_AGENT}
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                "https://nominatim.openstreetmap.org/reverse",
-                params=params,
-                headers=headers,
-            )
-            response.raise_for_status()
+        response = await get_http_client().get(
+            "https://nominatim.openstreetmap.org/reverse",
+            params=params,
+            headers=headers,
+        )
+        response.raise_for_status()
     except httpx.HTTPError:
         return None
 
@@ -52,6 +62,121 @@ async def get_address_from_coords(lat: float, lon: float) -> str | None:
     return None
 
 
+class RequestPacer:
+    """Равномерно разносит запросы во времени: не чаще ``rate`` в секунду."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+
+    def reserve(self, max_delay: float) -> float | None:
+        """Занять ближайший слот; None - если ждать дольше ``max_delay``."""
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        delay = slot - now
+        if delay > max_delay:
+            return None
+        self._next_slot = slot + self.interval
+        return delay
+
+
+# Политика Nominatim - не более 1 запроса в секунду
+_nominatim_pacer = RequestPacer(env_float("NOMINATIM_RATE", 1.0))
+# Сколько пользователь ждёт адрес, прежде чем увидит координаты
+NOMINATIM_DEADLINE = env_float("NOMINATIM_DEADLINE", 3.0)
+# Запросы, которым пришлось бы стоять в очереди дольше, не отправляются
+NOMINATIM_MAX_QUEUE_DELAY = env_float("NOMINATIM_MAX_QUEUE_DELAY", 30.0)
+
+# Запросы в полёте по ключу кеша (singleflight)
+_inflight: dict[str, asyncio.Task[str | None]] = {}
+
+
+async def _lookup_address(lat: float, lon: float) -> str | None:
+    delay = _nominatim_pacer.reserve(NOMINATIM_MAX_QUEUE_DELAY)
+    if delay is None:
+        return None
+    if delay:
+        await asyncio.sleep(delay)
+
+    try:
+        raw_address = await get_address_from_coords(lat, lon)
+    except Exception:
+        raw_address = None
+    if not raw_address:
+        return None
+
+    address = prettify_address(raw_address)
+    await geocode_cache.put(lat, lon, address)
+    return address
+
+
+def _start_lookup(lat: float, lon: float) -> asyncio.Task[str | None]:
+    # Одинаковые (с точностью кеша) точки ждут один и тот же запрос
+    key = geocode_cache.key(lat, lon)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_lookup_address(lat, lon))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return task
+
+
+# Офлайн-справочник адресов (см. utils.gazetteer); без него - только Nominatim
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH")
+GAZETTEER_MAX_DISTANCE = env_float("GAZETTEER_MAX_DISTANCE", 300.0)
+# Уточнять офлайн-адрес через Nominatim в фоне (результат попадёт в кеш)
+GEOCODER_REFINE = env_bool("GEOCODER_REFINE", True)
+
+_gazetteer: Gazetteer | None = None
+_gazetteer_failed = False
+
+
+def _get_gazetteer() -> Gazetteer | None:
+    global _gazetteer, _gazetteer_failed
+    if _gazetteer is None and GAZETTEER_PATH and not _gazetteer_failed:
+        try:
+            _gazetteer = Gazetteer(GAZETTEER_PATH)
+        except (OSError, ValueError):
+            logger.exception("Не удалось открыть справочник адресов %s", GAZETTEER_PATH)
+            _gazetteer_failed = True
+    return _gazetteer
+
+
+def get_offline_address(lat: float, lon: float) -> str | None:
+    """Адрес ближайшей точки справочника в формате _build_preferred_address."""
+    gazetteer = _get_gazetteer()
+    if gazetteer is None:
+        return None
+    return _build_preferred_address(gazetteer.nearest(lat, lon, GAZETTEER_MAX_DISTANCE))
+
+
+async def reverse_geocode(lat: float, lon: float) -> str:
+    """Адрес для показа пользователю: из кеша, справочника, Nominatim или сами координаты."""
+
+    cached = await geocode_cache.get(lat, lon)
+    if cached is not None:
+        return cached
+
+    offline = get_offline_address(lat, lon)
+    if offline:
+        if GEOCODER_REFINE:
+            _start_lookup(lat, lon)
+        return prettify_address(offline)
+
+    try:
+        # shield: после дедлайна запрос доработает и заполнит кеш
+        address = await asyncio.wait_for(
+            asyncio.shield(_start_lookup(lat, lon)), NOMINATIM_DEADLINE
+        )
+    except asyncio.TimeoutError:
+        address = None
+
+    if not address:
+        # Координаты не кешируем - в следующий раз попробуем снова
+        return prettify_address(f"{lat:.6f}, {lon:.6f}")
+    return address
+
+
 def prettify_address(raw: str) -> str:
     """Сделать адрес компактным и пригодным для отображения."""
 
@@ -0,0 +1,121 @@
+"""Поиск запрещённых слов в сообщениях групп.
+
+Список слов компилируется в одно регулярное выражение по префиксному
+дереву основ: текст сообщения проходится один раз, без цикла по словам.
+Текст и слова приводятся к одному виду (регистр, «ё», латинские
+двойники кириллицы, пунктуация), а слова - к основе без окончания,
+поэтому «кабаны», «кабанчик» и «К.а.б.а.н» находятся по слову «кабан».
+"""
+from __future__ import annotations
+
+import re
+from string import punctuation
+from typing import Iterable
+
+from common.restricted_words import restricted_words
+
+__all__ = ["RestrictedWordsMatcher", "normalize_text", "restricted_words_matcher", "word_stem"]
+
+# Латинские буквы, которыми подменяют похожие кириллические
+_HOMOGLYPHS = {
+    "a": "а", "b": "в", "c": "с", "e": "е", "h": "н", "k": "к", "m": "м",
+    "o": "о", "p": "р", "t": "т", "x": "х", "y": "у", "0": "о", "ё": "е",
+}
+_HOMOGLYPH_TABLE = str.maketrans(_HOMOGLYPHS)
+# Двойники не заменяются в тексте, а входят в шаблон классом символов
+_VARIANTS: dict[str, str] = {}
+for _char, _target in _HOMOGLYPHS.items():
+    _VARIANTS[_target] = _VARIANTS.get(_target, _target) + _char
+_PUNCTUATION_RE = re.compile(f"[{re.escape(punctuation + '«»„“”‘’—–…')}]+")
+
+_ENDINGS = sorted(
+    (
+        "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими",
+        "ах", "ях", "ов", "ев", "ей", "ий", "ый", "ой", "ая", "яя", "ое", "ее",
+        "ам", "ям", "ом", "ем", "ую", "юю",
+        "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+    ),
+    key=len,
+    reverse=True,
+)
+# Короче - слишком много ложных срабатываний внутри обычных слов
+_MIN_STEM = 4
+
+
+def normalize_text(text: str) -> str:
+    return _PUNCTUATION_RE.sub("", text.lower())
+
+
+def word_stem(word: str) -> str:
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[: -len(ending)]
+    return word
+
+
+def _char_pattern(char: str) -> str:
+    variants = _VARIANTS.get(char)
+    return f"[{variants}]" if variants else re.escape(char)
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        if "" in node and len(node) == 1:
+            return ""
+        optional = "" in node
+        branches = [_char_pattern(char) + build(child) for char, child in sorted(node.items()) if char]
+        body = branches[0] if len(branches) == 1 and not optional else f"(?:{'|'.join(branches)})"
+        return body + "?" if optional else body
+
+    return build(trie)
+
+
+class RestrictedWordsMatcher:
+    """Скомпилированный набор запрещённых слов; ``load`` заменяет его целиком."""
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self.words: frozenset[str] = frozenset()
+        self.version = 0
+        self._pattern: re.Pattern[str] | None = None
+        self.load(words)
+
+    def load(self, words: Iterable[str]) -> None:
+        normalized = frozenset(
+            filter(None, (normalize_text(word).translate(_HOMOGLYPH_TABLE).strip() for word in words))
+        )
+        # Основа, продолжающая другую основу, ничего не добавляет к поиску подстрок
+        stems: list[str] = []
+        for stem in sorted({word_stem(word) for word in normalized if len(word) >= _MIN_STEM}):
+            if not stems or not stem.startswith(stems[-1]):
+                stems.append(stem)
+        # Короткие слова ищем только целиком
+        short = {word for word in normalized if len(word) < _MIN_STEM}
+
+        parts = []
+        if stems:
+            parts.append(_trie_pattern(stems))
+        if short:
+            parts.append(rf"(?<!\w){_trie_pattern(short)}(?!\w)")
+        # Новый объект подменяется одним присваиванием - поиск не видит полусобранный набор
+        self._pattern = re.compile("|".join(parts)) if parts else None
+        self.words = normalized
+        self.version += 1
+
+    def find(self, text: str | None) -> str | None:
+        """Первый найденный запрещённый фрагмент (в нормализованном виде) или None."""
+        pattern = self._pattern
+        if pattern is None or not text:
+            return None
+        match = pattern.search(normalize_text(text))
+        return match.group() if match else None
+
+
+# До загрузки списка из БД работает встроенный набор
+restricted_words_matcher = RestrictedWordsMatcher(restricted_words)
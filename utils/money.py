@@ -17,3 +17,13 @@ def format_money(value: object) -> str:
     if "." in text:
         text = text.rstrip("0").rstrip(".")
     return text
+
+
+def to_minor(value: object) -> int:
+    """Convert monetary value to integer minor units (kopecks)."""
+    return int(to_decimal(value).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100)
+
+
+def from_minor(value: int) -> Decimal:
+    """Convert integer minor units back to :class:`Decimal`."""
+    return Decimal(int(value)).scaleb(-2)
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
 from typing import Awaitable, Callable, Mapping, Sequence
 
-from utils.money import format_money, to_decimal
+from database.cache import catalog
+from utils.money import format_money, from_minor, to_decimal, to_minor
 
 
 CURRENCY_SYMBOL = "₽"
@@ -56,6 +57,11 @@ class CustomerData:
         return f"{self.lat:.5f}, {self.lon:.5f}"
 
 
+# Версия формата корзины в FSM: при изменении формата старые снимки
+# не разбираются и корзина перечитывается из БД
+CART_STATE_VERSION = 1
+
+
 @dataclass(slots=True)
 class CartItemPayload:
     product_id: int
@@ -63,6 +69,10 @@ class CartItemPayload:
     quantity: int
     name: str
 
+    @property
+    def subtotal(self) -> Decimal:
+        return self.price * self.quantity
+
     def to_dict(self) -> dict[str, object]:
         return {
             "product_id": self.product_id,
@@ -74,7 +84,6 @@ class CartItemPayload:
 
 @dataclass(slots=True)
 class CartData:
-    lines: tuple[str, ...]
     items: tuple[CartItemPayload, ...]
     total: Decimal
 
@@ -86,81 +95,79 @@ class CartData:
     def items_payload(self) -> list[dict[str, object]]:
         return [item.to_dict() for item in self.items]
 
+    @property
+    def lines(self) -> tuple[str, ...]:
+        return tuple(
+            (
+                f"{idx}. {item.name} — {format_money(item.price)} {CURRENCY_SYMBOL} "
+                f"× {item.quantity} = {format_money(item.subtotal)} {CURRENCY_SYMBOL}"
+            )
+            for idx, item in enumerate(self.items, start=1)
+        )
+
     def lines_for_display(self) -> list[str]:
         return list(self.lines)
 
+    def to_state(self) -> dict[str, object]:
+        """Компактный снимок для FSM: [product_id, quantity, цена в копейках]."""
+        return {
+            "v": CART_STATE_VERSION,
+            "items": [
+                [item.product_id, item.quantity, to_minor(item.price)] for item in self.items
+            ],
+        }
+
     @classmethod
     def from_state(cls, data: Mapping[str, object]) -> "CartData | None":
-        raw_lines = data.get("cart_lines")
-        if not isinstance(raw_lines, (list, tuple)):
+        snapshot = data.get("cart")
+        if not isinstance(snapshot, Mapping) or snapshot.get("v") != CART_STATE_VERSION:
             return None
-        lines_tuple = tuple(str(line) for line in raw_lines if line is not None)
-        if not lines_tuple:
+        raw_items = snapshot.get("items")
+        if not isinstance(raw_items, (list, tuple)) or not raw_items:
             return None
 
-        raw_items = data.get("cart_items")
-        if not isinstance(raw_items, (list, tuple)):
-            return None
         items: list[CartItemPayload] = []
+        total_minor = 0
         for entry in raw_items:
-            item = _parse_cart_item(entry)
-            if item is None:
+            try:
+                product_id, quantity, price_minor = (int(value) for value in entry)
+            except (TypeError, ValueError):
                 return None
-            items.append(item)
-        if not items:
-            return None
-
-        total_raw = data.get("cart_total")
-        if total_raw is None:
-            return None
-        try:
-            total = Decimal(str(total_raw))
-        except (InvalidOperation, ValueError):
-            return None
-
-        return cls(lines_tuple, tuple(items), total)
+            total_minor += price_minor * quantity
+            items.append(
+                CartItemPayload(
+                    product_id=product_id,
+                    price=from_minor(price_minor),
+                    quantity=quantity,
+                    name=_product_name(product_id),
+                )
+            )
+        return cls(tuple(items), from_minor(total_minor))
 
     @classmethod
     def from_carts(cls, carts: Sequence) -> "CartData":
-        lines: list[str] = []
         items: list[CartItemPayload] = []
         total = Decimal("0")
 
-        for idx, cart in enumerate(carts, start=1):
-            price = to_decimal(cart.product.price)
-            quantity = int(cart.quantity)
-            subtotal = price * quantity
-            total += subtotal
-            name = str(cart.product.name)
-            lines.append(
-                (
-                    f"{idx}. {name} — {format_money(price)} {CURRENCY_SYMBOL} "
-                    f"× {quantity} = {format_money(subtotal)} {CURRENCY_SYMBOL}"
-                )
-            )
-            items.append(
-                CartItemPayload(
-                    product_id=int(cart.product_id),
-                    price=price,
-                    quantity=quantity,
-                    name=name,
-                )
+        for cart in carts:
+            item = CartItemPayload(
+                product_id=int(cart.product_id),
+                price=to_decimal(cart.product.price),
+                quantity=int(cart.quantity),
+                name=str(cart.product.name),
             )
+            total += item.subtotal
+            items.append(item)
 
-        return cls(tuple(lines), tuple(items), total)
+        return cls(tuple(items), total)
 
 
-def _parse_cart_item(entry: object) -> CartItemPayload | None:
-    if not isinstance(entry, Mapping):
-        return None
-    try:
-        product_id = int(entry["product_id"])
-        quantity = int(entry["quantity"])
-        price = Decimal(str(entry["price"]))
-        name = str(entry["name"])
-    except (KeyError, TypeError, ValueError, InvalidOperation):
-        return None
-    return CartItemPayload(product_id, price, quantity, name)
+def _product_name(product_id: int) -> str:
+    # Названия не хранятся в FSM - берём из каталога
+    product = catalog.product(product_id)
+    if product is None:
+        return f"Товар #{product_id}"
+    return product.name
 
 
 async def ensure_cart_data(
@@ -206,8 +213,7 @@ def prepare_summary_payload(
             "lat": customer.lat,
             "lon": customer.lon,
             "phone": customer.phone_for_display,
-            "cart_lines": cart.lines_for_display(),
-            "cart_total": cart.total_text,
+            "cart": cart.to_state(),
         }
     )
     return payload
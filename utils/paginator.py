@@ -1,24 +1,19 @@
 import math
 
 
-# Простой пагинатор
-class Paginator:
-    def __init__(self, array: list | tuple, page: int=1, per_page: int=1):
-        self.array = array
+# Пагинатор по известному количеству элементов: сами элементы
+# выбираются отдельно (например, запросом с OFFSET/LIMIT)
+class CountPaginator:
+    def __init__(self, count: int, page: int=1, per_page: int=1):
         self.per_page = per_page
         self.page = page
-        self.len = len(self.array)
+        self.len = count
         # math.ceil - округление в большую сторону до целого числа
         self.pages = math.ceil(self.len / self.per_page)
 
-    def __get_slice(self):
-        start = (self.page - 1) * self.per_page
-        stop = start + self.per_page
-        return self.array[start:stop]
-
-    def get_page(self):
-        page_items = self.__get_slice()
-        return page_items
+    @property
+    def offset(self):
+        return (self.page - 1) * self.per_page
 
     def has_next(self):
         if self.page < self.pages:
@@ -30,6 +25,22 @@ class Paginator:
             return self.page - 1
         return False
 
+
+# Простой пагинатор
+class Paginator(CountPaginator):
+    def __init__(self, array: list | tuple, page: int=1, per_page: int=1):
+        self.array = array
+        super().__init__(len(self.array), page=page, per_page=per_page)
+
+    def __get_slice(self):
+        start = self.offset
+        stop = start + self.per_page
+        return self.array[start:stop]
+
+    def get_page(self):
+        page_items = self.__get_slice()
+        return page_items
+
     def get_next(self):
         if self.page < self.pages:
             self.page += 1
@@ -40,4 +51,4 @@ class Paginator:
         if self.page > 1:
             self.page -= 1
             return self.__get_slice()
-        raise IndexError(f'Previous page does not exist. Use has_previous() to check before.')
\ No newline at end of file
+        raise IndexError(f'Previous page does not exist. Use has_previous() to check before.')
@@ -1,17 +1,31 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import re
+from collections import OrderedDict
+from html import escape, unescape
 from html.entities import name2codepoint
 from html.parser import HTMLParser
 from typing import Any
 
 import httpx
 
-__all__ = ["create_telegraph_page", "TelegraphError"]
+from utils.env import env_int
+from utils.http import get_http_client
 
-_TELEGRAPH_API_URL = "https://api.telegra.ph/createPage"
+__all__ = [
+    "create_telegraph_page",
+    "edit_telegraph_page",
+    "is_telegraph_configured",
+    "telegraph_page_path",
+    "telegraph_preview_text",
+    "TelegraphError",
+]
+
+_TELEGRAPH_API_BASE = "https://api.telegra.ph"
+_PAGE_URL_RE = re.compile(r"^https?://(?:telegra\.ph|graph\.org)/([^/?#]+)")
 _ALLOWED_TAGS = {
     "a",
     "aside",
@@ -100,22 +114,32 @@ _TAG_STRIP_RE = re.compile(r"<[^>]+>")
 
 
 class TelegraphError(RuntimeError):
-    """Base exception for Telegraph integration errors."""
+    """Base exception for Telegraph integration errors.
+
+    ``retryable`` is False when repeating the request cannot help
+    (missing token, rejected content or page).
+    """
+
+    def __init__(self, message: str, *, retryable: bool = True) -> None:
+        super().__init__(message)
+        self.retryable = retryable
 
 
 class _TelegraphContentError(TelegraphError):
     """Raised when provided HTML cannot be converted to Telegraph nodes."""
 
 
-class _TelegraphHTMLParser(HTMLParser):
+class _NodeBuilder:
+    """Builds Telegraph nodes from a stream of start/end tag and text events."""
+
     def __init__(self) -> None:
-        super().__init__()
         self._nodes: list[Any] = []
         self._node_stack: list[list[Any]] = [self._nodes]
         self._open_tags: list[str] = []
+        self._pre_depth = 0
         self._last_text: str | None = None
 
-    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+    def start(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
         if tag not in _ALLOWED_TAGS:
             raise _TelegraphContentError(f"Тег <{tag}> не поддерживается Telegraph.")
 
@@ -136,10 +160,12 @@ class _TelegraphHTMLParser(HTMLParser):
             node["children"] = children
             self._node_stack.append(children)
             self._open_tags.append(tag)
+            if tag == "pre":
+                self._pre_depth += 1
         else:
             self._last_text = None
 
-    def handle_endtag(self, tag: str) -> None:
+    def end(self, tag: str) -> None:
         if tag in _SELF_CLOSING_TAGS:
             return
 
@@ -151,20 +177,63 @@ class _TelegraphHTMLParser(HTMLParser):
             raise _TelegraphContentError(
                 f"Нарушен порядок закрытия тегов: ожидался </{expected}>, получен </{tag}>."
             )
+        if tag == "pre":
+            self._pre_depth -= 1
 
-        children = self._node_stack.pop()
+        self._node_stack.pop()
         node = self._node_stack[-1][-1]
 
-        if not node.get("children"):
-            node.pop("children", None)
+        if not node["children"]:
+            del node["children"]
 
         self._last_text = None
 
+    def text(self, text: str) -> None:
+        if not text:
+            return
+
+        current = self._node_stack[-1]
+
+        if not self._pre_depth:
+            text = _WHITESPACE_RE.sub(" ", text)
+            if self._last_text is None or self._last_text.endswith(" "):
+                text = text.lstrip(" ")
+            if not text:
+                self._last_text = None
+                return
+            self._last_text = text
+
+        if current and isinstance(current[-1], str):
+            current[-1] += text
+        else:
+            current.append(text)
+
+    def get_nodes(self) -> list[Any]:
+        if self._open_tags:
+            raise _TelegraphContentError(
+                f"Тег <{self._open_tags[-1]}> не закрыт."
+            )
+        return self._nodes
+
+
+class _TelegraphHTMLParser(HTMLParser):
+    """Full HTML tokenizer for markup the fast path does not handle."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._builder = _NodeBuilder()
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self._builder.start(tag, attrs)
+
+    def handle_endtag(self, tag: str) -> None:
+        self._builder.end(tag)
+
     def handle_data(self, data: str) -> None:
-        self._append_text(data)
+        self._builder.text(data)
 
     def handle_entityref(self, name: str) -> None:
-        self._append_text(chr(name2codepoint[name]))
+        self._builder.text(chr(name2codepoint[name]))
 
     def handle_charref(self, name: str) -> None:
         try:
@@ -177,37 +246,69 @@ class _TelegraphHTMLParser(HTMLParser):
                 f"Не удалось распознать HTML сущность &#{name};"
             ) from exc
 
-        self._append_text(chr(code_point))
+        self._builder.text(chr(code_point))
 
     def error(self, message: str) -> None:  # pragma: no cover - HTMLParser requirement
         raise _TelegraphContentError(message)
 
     def get_nodes(self) -> list[Any]:
-        if self._open_tags:
-            raise _TelegraphContentError(
-                f"Тег <{self._open_tags[-1]}> не закрыт."
-            )
-        return self._nodes
+        return self._builder.get_nodes()
 
-    def _append_text(self, text: str) -> None:
-        if not text:
-            return
-
-        current = self._node_stack[-1]
-
-        if "pre" not in self._open_tags:
-            text = _WHITESPACE_RE.sub(" ", text)
-            if self._last_text is None or self._last_text.endswith(" "):
-                text = text.lstrip(" ")
-            if not text:
-                self._last_text = None
-                return
-            self._last_text = text
 
-        if current and isinstance(current[-1], str):
-            current[-1] += text
+def _parse_with_html_parser(html: str) -> list[Any]:
+    parser = _TelegraphHTMLParser()
+    parser.feed(html)
+    parser.close()
+    return parser.get_nodes()
+
+
+# Text, closing tag or opening tag with quoted attributes. Anything else
+# (comments, doctype, unquoted values, a bare "<" in text) is left to HTMLParser.
+_TOKEN_RE = re.compile(
+    r"([^<]+)"
+    r"|</([a-zA-Z][a-zA-Z0-9]*)\s*>"
+    r"|<([a-zA-Z][a-zA-Z0-9]*)"
+    r"((?:\s+[a-zA-Z_:][-a-zA-Z0-9_:.]*(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'))?)*)"
+    r"\s*(/?)>"
+)
+_ATTR_RE = re.compile(
+    r"([a-zA-Z_:][-a-zA-Z0-9_:.]*)(\s*=\s*(?:\"([^\"]*)\"|'([^']*)'))?"
+)
+
+
+def _parse_attrs(raw_attrs: str) -> list[tuple[str, str | None]]:
+    attrs: list[tuple[str, str | None]] = []
+    for name, assignment, double, single in _ATTR_RE.findall(raw_attrs):
+        if not assignment:
+            attrs.append((name.lower(), None))
+            continue
+        value = double or single
+        attrs.append((name.lower(), unescape(value) if "&" in value else value))
+    return attrs
+
+
+def _parse_fast(html: str) -> list[Any] | None:
+    """Single-pass tokenizer; returns None when the markup needs HTMLParser."""
+    builder = _NodeBuilder()
+    position = 0
+    for match in _TOKEN_RE.finditer(html):
+        if match.start() != position:
+            return None
+        position = match.end()
+        text, end_tag, tag, raw_attrs, self_closing = match.groups()
+        if text is not None:
+            builder.text(unescape(text) if "&" in text else text)
+        elif end_tag is not None:
+            builder.end(end_tag.lower())
         else:
-            current.append(text)
+            tag = tag.lower()
+            builder.start(tag, _parse_attrs(raw_attrs) if raw_attrs else [])
+            if self_closing:
+                builder.end(tag)
+
+    if position != len(html):
+        return None
+    return builder.get_nodes()
 
 
 def _prepare_html_input(html: str) -> str:
@@ -232,29 +333,69 @@ def _prepare_html_input(html: str) -> str:
     return html.replace("\r", "").replace("\n", "<br>")
 
 
+_CONTENT_CACHE_SIZE = env_int("TELEGRAPH_CONTENT_CACHE_SIZE", 256)
+# blake2b(html) -> JSON nodes; repeated imports skip the conversion entirely
+_content_cache: OrderedDict[bytes, str] = OrderedDict()
+
+
 def _convert_html_to_content(html: str) -> str:
-    prepared_html = _prepare_html_input(html or "")
-    parser = _TelegraphHTMLParser()
+    html = html or ""
+    key = hashlib.blake2b(html.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    cached = _content_cache.get(key)
+    if cached is not None:
+        _content_cache.move_to_end(key)
+        return cached
+
+    prepared_html = _prepare_html_input(html)
 
     try:
-        parser.feed(prepared_html)
-        parser.close()
-        nodes = parser.get_nodes()
+        nodes = _parse_fast(prepared_html)
+        if nodes is None:
+            nodes = _parse_with_html_parser(prepared_html)
     except _TelegraphContentError:
-        sanitized = _WHITESPACE_RE.sub(" ", _TAG_STRIP_RE.sub(" ", html or "")).strip()
-        nodes: list[Any] = [sanitized] if sanitized else [""]
+        sanitized = _WHITESPACE_RE.sub(" ", _TAG_STRIP_RE.sub(" ", html)).strip()
+        nodes = [sanitized] if sanitized else [""]
     else:
         nodes = nodes if nodes else [""]
 
-    return json.dumps(nodes, ensure_ascii=False)
+    content = json.dumps(nodes, ensure_ascii=False)
+    if _CONTENT_CACHE_SIZE > 0:
+        _content_cache[key] = content
+        while len(_content_cache) > _CONTENT_CACHE_SIZE:
+            _content_cache.popitem(last=False)
+    return content
 
 
-async def create_telegraph_page(title: str, html: str) -> str:
-    """Create a Telegraph page and return its public URL."""
+# Подпись к фото ограничена 1024 символами; остаток - на название и цену
+PREVIEW_LIMIT = 700
+
+
+def telegraph_preview_text(html: str, limit: int = PREVIEW_LIMIT) -> str:
+    """Short plain-text description (HTML-escaped) for a caption while the page is not ready."""
+    text = _WHITESPACE_RE.sub(" ", unescape(_TAG_STRIP_RE.sub(" ", html or ""))).strip()
+    if len(text) > limit:
+        text = text[: limit - 1].rstrip() + "…"
+    return escape(text, quote=False)
+
+
+def is_telegraph_configured() -> bool:
+    return bool(os.getenv("TELEGRAPH_TOKEN"))
 
+
+def telegraph_page_path(url: str | None) -> str | None:
+    """Путь страницы (``Title-01-01``) из её публичного URL."""
+    if not url:
+        return None
+    match = _PAGE_URL_RE.match(url.strip())
+    return match.group(1) if match else None
+
+
+async def _call_telegraph(method: str, title: str, html: str) -> str:
     access_token = os.getenv("TELEGRAPH_TOKEN")
     if not access_token:
-        raise TelegraphError("Переменная окружения TELEGRAPH_TOKEN не установлена.")
+        raise TelegraphError(
+            "Переменная окружения TELEGRAPH_TOKEN не установлена.", retryable=False
+        )
 
     payload = {
         "access_token": access_token,
@@ -264,9 +405,15 @@ async def create_telegraph_page(title: str, html: str) -> str:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.post(_TELEGRAPH_API_URL, data=payload)
-            response.raise_for_status()
+        response = await get_http_client().post(f"{_TELEGRAPH_API_BASE}/{method}", data=payload)
+        response.raise_for_status()
+    except httpx.HTTPStatusError as exc:
+        # 4xx (кроме 429) повторять бессмысленно
+        status = exc.response.status_code
+        raise TelegraphError(
+            f"Ошибка при обращении к Telegraph: {exc}",
+            retryable=status >= 500 or status == 429,
+        ) from exc
     except httpx.HTTPError as exc:
         raise TelegraphError(f"Ошибка при обращении к Telegraph: {exc}") from exc
 
@@ -277,11 +424,27 @@ async def create_telegraph_page(title: str, html: str) -> str:
 
     if not response_data.get("ok"):
         error_message = response_data.get("error") or "Неизвестная ошибка Telegraph."
-        raise TelegraphError(f"Telegraph API: {error_message}")
+        # Кроме FLOOD_WAIT_N ошибки API относятся к самому запросу
+        raise TelegraphError(
+            f"Telegraph API: {error_message}",
+            retryable=str(error_message).startswith("FLOOD_WAIT"),
+        )
 
     result = response_data.get("result") or {}
     url = result.get("url")
     if not url:
-        raise TelegraphError("Telegraph не вернул ссылку на созданную страницу.")
+        raise TelegraphError(
+            "Telegraph не вернул ссылку на созданную страницу.", retryable=False
+        )
 
     return url
+
+
+async def create_telegraph_page(title: str, html: str) -> str:
+    """Create a Telegraph page and return its public URL."""
+    return await _call_telegraph("createPage", title, html)
+
+
+async def edit_telegraph_page(path: str, title: str, html: str) -> str:
+    """Replace content of an existing Telegraph page and return its URL."""
+    return await _call_telegraph(f"editPage/{path}", title, html)
@@ -0,0 +1,190 @@
+"""Фоновая очередь публикации страниц Telegraph.
+
+Админка не ждёт Telegraph: ``submit`` ставит задачу и сразу возвращает
+её ключ (хеш содержимого), а ссылку на готовую страницу получают
+колбэки, привязанные через ``on_ready``. Одинаковое содержимое не
+публикуется повторно, существующие страницы обновляются через editPage.
+
+Очередь живёт только в памяти процесса: задачи, не выполненные до
+перезапуска, теряются. Товар при этом остаётся с кратким текстовым
+описанием (``telegraph_preview_text``), а страницу можно опубликовать
+заново, изменив описание товара в админке.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from utils.env import env_float, env_int
+from utils.telegraph import TelegraphError, create_telegraph_page, edit_telegraph_page
+
+__all__ = ["TelegraphJobQueue", "telegraph_jobs"]
+
+logger = logging.getLogger(__name__)
+
+ReadyCallback = Callable[[str], Awaitable[None]]
+# Получает текст ошибки публикации
+FailureCallback = Callable[[str], Awaitable[None]]
+
+
+@dataclass(slots=True)
+class TelegraphJob:
+    key: str
+    title: str
+    html: str
+    path: str | None
+    callbacks: list[ReadyCallback] = field(default_factory=list)
+    failure_callbacks: list[FailureCallback] = field(default_factory=list)
+
+
+class TelegraphJobQueue:
+    def __init__(
+        self,
+        workers: int = 2,
+        max_attempts: int = 5,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+        cache_size: int = 1000,
+    ) -> None:
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cache_size = cache_size
+        self._queue: asyncio.Queue[TelegraphJob] = asyncio.Queue()
+        self._pending: dict[str, TelegraphJob] = {}
+        # ключ содержимого -> URL опубликованной страницы
+        self._urls: OrderedDict[str, str] = OrderedDict()
+        # ключ содержимого -> текст ошибки последней неудачной публикации
+        self._failures: OrderedDict[str, str] = OrderedDict()
+        self._workers: list[asyncio.Task[None]] = []
+        self._notifications: set[asyncio.Task[None]] = set()
+
+    @staticmethod
+    def content_key(title: str, html: str, path: str | None = None) -> str:
+        digest = hashlib.sha256()
+        for part in (path or "", title, html):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def url_for(self, key: str) -> str | None:
+        return self._urls.get(key)
+
+    def submit(self, title: str, html: str, path: str | None = None) -> str:
+        """Поставить публикацию в очередь; вернуть ключ задачи."""
+        key = self.content_key(title, html, path)
+        if key in self._urls or key in self._pending:
+            return key
+        self._failures.pop(key, None)
+        job = TelegraphJob(key, title, html, path)
+        self._pending[key] = job
+        self._queue.put_nowait(job)
+        self._ensure_workers()
+        return key
+
+    def on_ready(
+        self,
+        key: str,
+        callback: ReadyCallback,
+        on_failure: FailureCallback | None = None,
+    ) -> bool:
+        """Вызвать ``callback(url)``, когда страница готова, или ``on_failure(error)``.
+
+        Если публикация уже завершилась, колбэк вызывается сразу.
+        Возвращает False, если задача неизвестна (например, потеряна при
+        перезапуске) - тогда не вызывается ни один колбэк.
+        """
+        url = self._urls.get(key)
+        if url is not None:
+            self._spawn(self._notify(callback, url))
+            return True
+        error = self._failures.get(key)
+        if error is not None:
+            if on_failure is not None:
+                self._spawn(self._notify(on_failure, error))
+            return True
+        job = self._pending.get(key)
+        if job is None:
+            return False
+        job.callbacks.append(callback)
+        if on_failure is not None:
+            job.failure_callbacks.append(on_failure)
+        return True
+
+    def _ensure_workers(self) -> None:
+        self._workers = [task for task in self._workers if not task.done()]
+        while len(self._workers) < self.workers:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.create_task(coro)
+        self._notifications.add(task)
+        task.add_done_callback(self._notifications.discard)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: TelegraphJob) -> None:
+        url = None
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if job.path:
+                    url = await edit_telegraph_page(job.path, job.title, job.html)
+                else:
+                    url = await create_telegraph_page(job.title, job.html)
+                break
+            except TelegraphError as exc:
+                error = str(exc)
+                if not exc.retryable or attempt == self.max_attempts:
+                    logger.error("Telegraph: публикация не удалась (попыток: %s): %s", attempt, exc)
+                    break
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                logger.warning("Telegraph: %s, повтор через %.0f с", exc, delay)
+                await asyncio.sleep(delay)
+
+        self._pending.pop(job.key, None)
+        if url is None:
+            self._failures[job.key] = error or "неизвестная ошибка"
+            while len(self._failures) > self.cache_size:
+                self._failures.popitem(last=False)
+            for on_failure in job.failure_callbacks:
+                await self._notify(on_failure, self._failures[job.key])
+            return
+
+        self._urls[job.key] = url
+        while len(self._urls) > self.cache_size:
+            self._urls.popitem(last=False)
+        for callback in job.callbacks:
+            await self._notify(callback, url)
+
+    @staticmethod
+    async def _notify(callback: ReadyCallback | FailureCallback, value: str) -> None:
+        try:
+            await callback(value)
+        except Exception:
+            logger.exception("Telegraph: ошибка в обработчике готовой страницы")
+
+    async def close(self) -> None:
+        tasks = [*self._workers, *self._notifications]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers.clear()
+
+
+telegraph_jobs = TelegraphJobQueue(
+    workers=env_int("TELEGRAPH_WORKERS", 2),
+    max_attempts=env_int("TELEGRAPH_MAX_ATTEMPTS", 5),
+    base_delay=env_float("TELEGRAPH_RETRY_DELAY", 2.0),
+)
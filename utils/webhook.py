@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from pydantic import ValidationError
+
+from utils.env import env_int
+
+__all__ = ["WebhookSettings", "WebhookUpdateQueue", "run_webhook"]
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+@dataclass(slots=True)
+class WebhookSettings:
+    host: str
+    port: int
+    path: str
+    url: str | None
+    secret: str | None
+    queue_size: int
+    workers: int
+
+    @classmethod
+    def from_env(cls) -> "WebhookSettings":
+        path = os.getenv("WEBHOOK_PATH") or "/bot"
+        if not path.startswith("/"):
+            path = "/" + path
+        return cls(
+            host=os.getenv("WEBHOOK_HOST") or "0.0.0.0",
+            port=env_int("WEBHOOK_PORT", 8000),
+            path=path,
+            url=os.getenv("WEBHOOK_URL") or None,
+            secret=os.getenv("WEBHOOK_SECRET") or None,
+            queue_size=max(1, env_int("WEBHOOK_QUEUE_SIZE", 1000)),
+            workers=max(1, env_int("WEBHOOK_WORKERS", 8)),
+        )
+
+
+class WebhookUpdateQueue:
+    """Принимает апдейты от Telegram и отдаёт их диспетчеру через очередь.
+
+    HTTP-обработчик только проверяет секрет и кладёт тело запроса в
+    ограниченную очередь, поэтому Telegram сразу получает 200. Апдейты
+    разбирают фоновые воркеры.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        *,
+        secret: str | None = None,
+        maxsize: int = 1000,
+        workers: int = 8,
+    ) -> None:
+        self._dispatcher = dispatcher
+        self._bot = bot
+        self._secret = secret
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=maxsize)
+        self._workers_count = workers
+        self._workers: list[asyncio.Task] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self._secret:
+            token = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(token, self._secret):
+                return web.Response(status=401)
+
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram повторит доставку, если ответ не 2xx.
+            logger.warning("Webhook queue is full, update %s rejected", update.get("update_id"))
+            return web.Response(status=503)
+
+        return web.Response(text="ok")
+
+    async def start(self) -> None:
+        for _ in range(self._workers_count):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook queue was not drained, %d updates dropped", self._queue.qsize())
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self._queue.get()
+            try:
+                await self._dispatcher.feed_raw_update(self._bot, update)
+            except ValidationError:
+                logger.warning("Skipping malformed update %s", update.get("update_id"))
+            except Exception:
+                logger.exception("Failed to process update %s", update.get("update_id"))
+            finally:
+                self._queue.task_done()
+
+
+async def run_webhook(
+    dispatcher: Dispatcher, bot: Bot, settings: WebhookSettings | None = None
+) -> None:
+    """Запустить aiohttp-сервер и обрабатывать апдейты до остановки процесса."""
+    settings = settings or WebhookSettings.from_env()
+    updates = WebhookUpdateQueue(
+        dispatcher,
+        bot,
+        secret=settings.secret,
+        maxsize=settings.queue_size,
+        workers=settings.workers,
+    )
+
+    app = web.Application()
+    app.router.add_post(settings.path, updates.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+
+    await dispatcher.emit_startup(bot=bot)
+    await updates.start()
+    try:
+        if settings.url:
+            await bot.set_webhook(
+                settings.url,
+                secret_token=settings.secret,
+                allowed_updates=dispatcher.resolve_used_update_types(),
+                drop_pending_updates=True,
+            )
+        site = web.TCPSite(runner, settings.host, settings.port)
+        await site.start()
+        logger.info(
+            "Webhook server listening on http://%s:%d%s",
+            settings.host,
+            settings.port,
+            settings.path,
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await updates.stop()
+        await dispatcher.emit_shutdown(bot=bot)
+        await bot.session.close()